@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import json
+import os
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import CHANGE_LOG_MAX_ENTRIES, CHANGE_LOG_PATH
+
+CHANGE_OPERATIONS = ("created", "updated", "deleted")
+
+
+class ChangeLog:
+    """
+    Append-only log of event changes. Every entry gets the next sequence
+    number. Consumers resume with a cursor '<log_id>:<seq>'; the log_id is
+    new for every log, so a cursor from another log (e.g. an in-memory log
+    before a restart) is detected instead of silently matching sequence
+    numbers that were reused. Only the newest max_entries are kept in memory;
+    if path is set, entries are also appended to a JSON-lines file (whose
+    first line records the log_id) and the tail is reloaded on start.
+    """
+
+    def __init__(self, max_entries: int = CHANGE_LOG_MAX_ENTRIES, path: Optional[str] = None):
+        self.entries: deque = deque(maxlen=max_entries)
+        self.last_seq = 0
+        self.log_id = uuid.uuid4().hex
+        self.path = path or None
+        self._new_entry = asyncio.Event()
+        if self.path and os.path.exists(self.path) and os.path.getsize(self.path):
+            self._load()
+        elif self.path:
+            with open(self.path, "w", encoding="utf-8") as log_file:
+                log_file.write(json.dumps({"log_id": self.log_id}) + "\n")
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as log_file:
+            for line in log_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "log_id" in record:
+                    self.log_id = record["log_id"]
+                else:
+                    self.entries.append(record)
+        if self.entries:
+            self.last_seq = self.entries[-1]["seq"]
+        print(f"Change log {self.log_id} restored up to sequence {self.last_seq} from {self.path}.")
+
+    def cursor(self, seq: int) -> str:
+        return f"{self.log_id}:{seq}"
+
+    def parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """Sequence number of a cursor; 0 without a cursor, None if the cursor is from another log."""
+        if not cursor:
+            return 0
+        log_id, _, seq = cursor.rpartition(":")
+        if log_id != self.log_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    @property
+    def first_seq(self) -> int:
+        return self.entries[0]["seq"] if self.entries else self.last_seq + 1
+
+    def append(self, op: str, event_id: str, event: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if op not in CHANGE_OPERATIONS:
+            raise ValueError(f"Unknown change operation '{op}'")
+        self.last_seq += 1
+        entry = {
+            "seq": self.last_seq,
+            "op": op,
+            "id": event_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "event": event
+        }
+        self.entries.append(entry)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(entry) + "\n")
+        # Wake up every waiting consumer, then arm a fresh event for the next append
+        self._new_entry.set()
+        self._new_entry = asyncio.Event()
+        return entry
+
+    def since(self, cursor: Optional[str], limit: int = 100) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Returns up to limit entries after cursor, and whether the consumer
+        must reset (rescan the index) because entries after its cursor were
+        evicted or the cursor is from another log.
+        """
+        seq = self.parse_cursor(cursor)
+        if seq is None or seq > self.last_seq or seq < self.first_seq - 1:
+            return [], True
+        start = seq - self.first_seq + 1
+        return list(itertools.islice(self.entries, start, start + limit)), False
+
+    async def wait(self, cursor: Optional[str], timeout: float) -> None:
+        """Waits until an entry after cursor exists, or timeout seconds pass."""
+        seq = self.parse_cursor(cursor)
+        if seq is None or seq < self.last_seq:
+            return
+        try:
+            await asyncio.wait_for(self._new_entry.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+change_log = ChangeLog(path=CHANGE_LOG_PATH)
+
+
+def format_sse(entry: Dict[str, Any], cursor: str) -> str:
+    """Formats an entry as a Server-Sent Event; the cursor id lets clients resume via Last-Event-ID."""
+    return f"id: {cursor}\nevent: {entry['op']}\ndata: {json.dumps(entry)}\n\n"
+
+
+async def stream_changes(log: ChangeLog, cursor: Optional[str], is_disconnected, wait_seconds: float, batch_size: int = 100):
+    """
+    Yields Server-Sent Events for entries after cursor until the client goes
+    away. Sends a reset event when the cursor can no longer be served, and a
+    comment line after each idle wait so proxies keep the connection open.
+    """
+    while not await is_disconnected():
+        entries, reset = log.since(cursor, batch_size)
+        if reset:
+            cursor = log.cursor(log.last_seq)
+            yield f"event: reset\ndata: {json.dumps({'cursor': cursor})}\n\n"
+            continue
+        for entry in entries:
+            cursor = log.cursor(entry["seq"])
+            yield format_sse(entry, cursor)
+        if not entries:
+            await log.wait(cursor, wait_seconds)
+            if log.parse_cursor(cursor) == log.last_seq:
+                yield ": keep-alive\n\n"
@@ -1,3 +1,4 @@
+import json
 import os
 
 ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://elasticsearch:9200")
@@ -5,6 +6,8 @@ ONNX_MODEL_DIRECTORY = os.getenv("ONNX_MODEL_DIRECTORY", "/app/gte-multilingual-
 # Dimensions for the GTE multilingual base model.
 VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "768"))
 INDEX_NAME = os.getenv("INDEX_NAME", "events")
+# Storage backend: "elasticsearch" or "memory" (in-process stand-in for tests and benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "elasticsearch").lower()
 
 # FastAPI app settings
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
@@ -12,8 +15,35 @@ APP_PORT = int(os.getenv("APP_PORT", "8000"))
 
 # ONNX Model settings
 MAX_SEQ_LENGTH = int(os.getenv("MAX_SEQ_LENGTH", "512"))
+# Load the model when src.embedding is imported; tools that load their own models turn this off
+ONNX_MODEL_PRELOAD = os.getenv("ONNX_MODEL_PRELOAD", "True").lower() == "true"
+# Multi-vector mode: embed overlapping token windows of the description in one batched call
+CHUNK_EMBEDDINGS_ENABLED = os.getenv("CHUNK_EMBEDDINGS_ENABLED", "False").lower() == "true"
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "128")) # Tokens per window, excluding special tokens
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "32")) # Caps the batch size for very long texts
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
 
 # Elasticsearch client settings
 ES_REQUEST_TIMEOUT = int(os.getenv("ES_REQUEST_TIMEOUT", "30"))
 ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
-ES_RETRY_ON_TIMEOUT = os.getenv("ES_RETRY_ON_TIMEOUT", "True").lower() == "true"
\ No newline at end of file
+ES_RETRY_ON_TIMEOUT = os.getenv("ES_RETRY_ON_TIMEOUT", "True").lower() == "true"
+
+# Hybrid search settings (BM25 + kNN fused with reciprocal rank fusion)
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "50"))
+HYBRID_KNN_CANDIDATES = int(os.getenv("HYBRID_KNN_CANDIDATES", "50"))
+RRF_RANK_CONSTANT = int(os.getenv("RRF_RANK_CONSTANT", "60"))
+
+# Precomputed recommendation feeds
+# JSON object of topic name -> {"query": text to embed as the topic centroid, or "vector": [...],
+# optional "lat"/"lon" center}, e.g. {"copenhagen": {"query": "events in Copenhagen", "lat": 55.68, "lon": 12.57}}
+FEED_TOPICS = json.loads(os.getenv("FEED_TOPICS", "{}"))
+FEED_MAX_ITEMS = int(os.getenv("FEED_MAX_ITEMS", "500")) # Ranked candidates kept per topic
+FEED_REFRESH_SECONDS = int(os.getenv("FEED_REFRESH_SECONDS", "300"))
+FEED_TIME_HALF_LIFE_DAYS = float(os.getenv("FEED_TIME_HALF_LIFE_DAYS", "7"))
+FEED_GEO_SCALE_KM = float(os.getenv("FEED_GEO_SCALE_KM", "25"))
+
+# Change log of created/updated/deleted events
+CHANGE_LOG_MAX_ENTRIES = int(os.getenv("CHANGE_LOG_MAX_ENTRIES", "10000")) # Entries kept for cursor resume
+CHANGE_LOG_PATH = os.getenv("CHANGE_LOG_PATH", "") # Optional JSON-lines file to persist the log
+CHANGES_MAX_WAIT_SECONDS = float(os.getenv("CHANGES_MAX_WAIT_SECONDS", "30")) # Long-poll / keep-alive interval
@@ -1,9 +1,78 @@
 from elasticsearch import Elasticsearch, ApiError
-from .config import ELASTICSEARCH_URL, ES_REQUEST_TIMEOUT, ES_MAX_RETRIES, ES_RETRY_ON_TIMEOUT, INDEX_NAME, VECTOR_DIMENSIONS
-from typing import Dict, Any
+from .config import ELASTICSEARCH_URL, ES_REQUEST_TIMEOUT, ES_MAX_RETRIES, ES_RETRY_ON_TIMEOUT, INDEX_NAME, VECTOR_DIMENSIONS, STORAGE_BACKEND, CHUNK_EMBEDDINGS_ENABLED
+from .config import HYBRID_LEXICAL_CANDIDATES, HYBRID_KNN_CANDIDATES, RRF_RANK_CONSTANT
+from .storage import StorageBackend, ElasticsearchBackend, InMemoryBackend
+from typing import Dict, Any, List, Optional
 from generated_models import Event
 
 es_client: Elasticsearch | None = None
+storage_backend: StorageBackend | None = None
+chunk_mapping_checked = False
+
+# Storage-only fields, dropped from documents returned to API clients
+VECTOR_FIELDS = ["vector_embedding", "vector_chunks"]
+
+EVENTS_INDEX_MAPPING = {
+    "mappings": {
+        "properties": {
+            "id": {"type": "keyword"},
+            "title": {"type": "text", "analyzer": "standard"},
+            "description": {"type": "text", "analyzer": "standard"},
+            "start_time": {"type": "date"},
+            "end_time": {"type": "date"},
+            "location": {
+                "properties": {
+                    "name": {"type": "text"},
+                    "address": {"type": "text"},
+                    "geo": {"type": "geo_point"}
+                }
+            },
+            "organizer_info": {
+                "properties": {
+                    "name": {"type": "keyword"},
+                    "contact_email": {"type": "keyword"},
+                    "website": {"type": "keyword"}
+                }
+            },
+            "action_link": {
+                "properties": {
+                    "url": {"type": "keyword"},
+                    "text": {"type": "text"},
+                    "type": {"type": "keyword"}
+                }
+            },
+            "signature": {"type": "keyword"},
+            "media": {
+                "properties": {
+                    "type": {"type": "keyword"},
+                    "value": {"type": "keyword"}
+                }
+            },
+            "related_links": {
+                "type": "nested",
+                "properties": {
+                    "url": {"type": "keyword"},
+                    "text": {"type": "text"},
+                    "type": {"type": "keyword"}
+                }
+            },
+            "vector_embedding": {
+                "type": "dense_vector",
+                "dims": VECTOR_DIMENSIONS
+            },
+            # One entry per description chunk; kNN on a nested field scores each event by its best chunk
+            "vector_chunks": {
+                "type": "nested",
+                "properties": {
+                    "vector": {
+                        "type": "dense_vector",
+                        "dims": VECTOR_DIMENSIONS
+                    }
+                }
+            }
+        }
+    }
+}
 
 def init_es_client():
     global es_client
@@ -24,70 +93,40 @@ def init_es_client():
         print(f"FATAL: An unexpected error occurred during Elasticsearch client initialization: {e}")
         es_client = None
 
+def init_storage_backend():
+    """
+    Selects the storage backend from STORAGE_BACKEND.
+    'memory' keeps everything in-process and needs no running services.
+    """
+    global storage_backend
+    if STORAGE_BACKEND == "memory":
+        if not isinstance(storage_backend, InMemoryBackend):
+            storage_backend = InMemoryBackend()
+            print("Using in-memory storage backend.")
+        return
+    if STORAGE_BACKEND != "elasticsearch":
+        print(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}', falling back to elasticsearch.")
+    init_es_client()
+    storage_backend = ElasticsearchBackend(es_client) if es_client else None
+
+def get_storage_backend() -> StorageBackend | None:
+    return storage_backend
+
 async def ensure_events_index_exists():
-    if not es_client or not es_client.ping(): # Check ping again in case connection dropped
-        print("Cannot ensure index exists: Elasticsearch client not available or connection lost.")
+    if not storage_backend or not storage_backend.ping(): # Check ping again in case connection dropped
+        print("Cannot ensure index exists: storage backend not available or connection lost.")
         # Attempt to re-initialize, could be a transient issue
-        init_es_client()
-        if not es_client or not es_client.ping():
-             print("Re-initialization failed. Elasticsearch client still not available.")
+        init_storage_backend()
+        if not storage_backend or not storage_backend.ping():
+             print("Re-initialization failed. Storage backend still not available.")
              return False # Still not available after re-init attempt
 
     try:
-        if not es_client.indices.exists(index=INDEX_NAME):
-            mapping = {
-                "mappings": {
-                    "properties": {
-                        "id": {"type": "keyword"},
-                        "title": {"type": "text", "analyzer": "standard"},
-                        "description": {"type": "text", "analyzer": "standard"},
-                        "start_time": {"type": "date"},
-                        "end_time": {"type": "date"},
-                        "location": {
-                            "properties": {
-                                "name": {"type": "text"},
-                                "address": {"type": "text"},
-                                "geo": {"type": "geo_point"}
-                            }
-                        },
-                        "organizer_info": {
-                            "properties": {
-                                "name": {"type": "keyword"},
-                                "contact_email": {"type": "keyword"},
-                                "website": {"type": "keyword"}
-                            }
-                        },
-                        "action_link": {
-                            "properties": {
-                                "url": {"type": "keyword"},
-                                "text": {"type": "text"},
-                                "type": {"type": "keyword"}
-                            }
-                        },
-                        "signature": {"type": "keyword"},
-                        "media": {
-                            "properties": {
-                                "type": {"type": "keyword"},
-                                "value": {"type": "keyword"}
-                            }
-                        },
-                        "related_links": {
-                            "type": "nested",
-                            "properties": {
-                                "url": {"type": "keyword"},
-                                "text": {"type": "text"},
-                                "type": {"type": "keyword"}
-                            }
-                        },
-                        "vector_embedding": {
-                            "type": "dense_vector",
-                            "dims": VECTOR_DIMENSIONS
-                        }
-                    }
-                }
-            }
-            es_client.indices.create(index=INDEX_NAME, body=mapping)
+        if not storage_backend.index_exists(INDEX_NAME):
+            storage_backend.create_index(INDEX_NAME, EVENTS_INDEX_MAPPING)
             print(f"Index '{INDEX_NAME}' created with mapping.")
+        elif not chunk_mapping_checked:
+            ensure_chunk_mapping()
         return True
     except ApiError as e:
         print(f"Error ensuring Elasticsearch index '{INDEX_NAME}' exists: {e}")
@@ -96,19 +135,50 @@ async def ensure_events_index_exists():
         print(f"Unexpected error in ensure_events_index_exists: {e}")
         return False
 
-async def index_event(event_model: Event): # Changed signature to accept Event model
-    if not es_client:
-        print(f"Cannot index event {event_model.id}: Elasticsearch client not available.")
+def ensure_chunk_mapping():
+    """
+    Adds the nested vector_chunks mapping to an index created before chunk
+    embeddings existed. Otherwise the first chunked event maps the field
+    dynamically as plain floats, and kNN on vector_chunks.vector fails.
+    Raises if the field is already mapped differently; only a reindex fixes that.
+    """
+    global chunk_mapping_checked
+    chunk_field = {"vector_chunks": EVENTS_INDEX_MAPPING["mappings"]["properties"]["vector_chunks"]}
+    try:
+        storage_backend.put_mapping(INDEX_NAME, chunk_field)
+    except Exception as e:
+        if CHUNK_EMBEDDINGS_ENABLED:
+            # Refuse to ingest: every chunked kNN query would fail against this mapping
+            print(f"Index '{INDEX_NAME}' has an incompatible vector_chunks mapping; reindex before enabling CHUNK_EMBEDDINGS_ENABLED: {e}")
+            raise
+        print(f"Warning: Index '{INDEX_NAME}' has an incompatible vector_chunks mapping; chunk embeddings cannot be enabled until it is reindexed: {e}")
+    chunk_mapping_checked = True
+
+def event_document(event_model: Event, embedding: Optional[List[float]] = None,
+                   chunk_embeddings: Optional[List[List[float]]] = None) -> Dict[str, Any]:
+    # Use model_dump(mode='json') for the document body
+    document = event_model.model_dump(mode='json')
+    if embedding is not None:
+        # Stored with the document only, so API responses built from the model stay small
+        document["vector_embedding"] = embedding
+    if chunk_embeddings:
+        # Storage-only field, not part of the public Event schema
+        document["vector_chunks"] = [{"vector": vector} for vector in chunk_embeddings]
+    return document
+
+async def index_event(event_model: Event, embedding: Optional[List[float]] = None,
+                      chunk_embeddings: Optional[List[List[float]]] = None): # Changed signature to accept Event model
+    if not storage_backend:
+        print(f"Cannot index event {event_model.id}: storage backend not available.")
         return False # Or raise an exception
     try:
-        # Use model_dump(mode='json') for the document body
-        await es_client.index(
+        result = storage_backend.index(
             index=INDEX_NAME,
             id=event_model.id,
-            document=event_model.model_dump(mode='json') # Use mode='json'
+            document=event_document(event_model, embedding, chunk_embeddings)
         )
-        print(f"Event {event_model.id} indexed successfully.")
-        return True
+        print(f"Event {event_model.id} indexed successfully ({result}).")
+        return result # 'created' or 'updated'; truthy like the previous True
     except ApiError as e:
         print(f"Error indexing event {event_model.id} to Elasticsearch: {e}")
         # Potentially raise a custom exception here to be handled by the route
@@ -117,8 +187,53 @@ async def index_event(event_model: Event): # Changed signature to accept Event m
         print(f"Unexpected error indexing event {event_model.id}: {e}")
         raise # Re-raise for visibility
 
-# Call init_es_client when the module is loaded.
+async def delete_event(event_id: str) -> bool:
+    if not storage_backend:
+        print(f"Cannot delete event {event_id}: storage backend not available.")
+        return False
+    deleted = storage_backend.delete(index=INDEX_NAME, id=event_id)
+    if deleted:
+        print(f"Event {event_id} deleted.")
+    return deleted
+
+async def search_similar_events(query_vector: List[float], k: int = 10, use_chunks: bool = CHUNK_EMBEDDINGS_ENABLED) -> List[Dict[str, Any]]:
+    """
+    kNN search over events. With use_chunks, each event is scored by its best
+    matching description chunk instead of the pooled document vector.
+    """
+    if not storage_backend:
+        print("Cannot search events: storage backend not available.")
+        return []
+    field = "vector_chunks.vector" if use_chunks else "vector_embedding"
+    return storage_backend.knn_search(index=INDEX_NAME, field=field, query_vector=query_vector, k=k,
+                                      source_excludes=VECTOR_FIELDS)
+
+async def hybrid_search_events(query_text: str, query_vector: Optional[List[float]], k: int = 10,
+                               lexical_candidates: int = HYBRID_LEXICAL_CANDIDATES,
+                               knn_candidates: int = HYBRID_KNN_CANDIDATES,
+                               use_chunks: bool = CHUNK_EMBEDDINGS_ENABLED) -> List[Dict[str, Any]]:
+    """
+    BM25 over title/description plus kNN over the embeddings, fused with
+    reciprocal rank fusion in a single storage round trip.
+    """
+    if not storage_backend:
+        print("Cannot search events: storage backend not available.")
+        return []
+    return storage_backend.hybrid_search(
+        index=INDEX_NAME,
+        query_text=query_text,
+        text_fields=["title", "description"],
+        vector_field="vector_chunks.vector" if use_chunks else "vector_embedding",
+        query_vector=query_vector,
+        k=k,
+        lexical_candidates=lexical_candidates,
+        knn_candidates=knn_candidates,
+        rank_constant=RRF_RANK_CONSTANT,
+        source_excludes=VECTOR_FIELDS
+    )
+
+# Call init_storage_backend when the module is loaded.
 # Alternatively, this can be called in a FastAPI startup event.
 # For simplicity here, we initialize it at module load.
 # If the app structure allows for async startup, that's preferred.
-init_es_client()
\ No newline at end of file
+init_storage_backend()
@@ -1,14 +1,36 @@
 import os
+import functools
 import numpy as np
 import onnxruntime as ort
 from tokenizers import Tokenizer
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from .config import ONNX_MODEL_DIRECTORY, MAX_SEQ_LENGTH
+from .config import ONNX_MODEL_DIRECTORY, MAX_SEQ_LENGTH, CHUNK_SIZE, CHUNK_OVERLAP, MAX_CHUNKS, QUERY_EMBEDDING_CACHE_SIZE, ONNX_MODEL_PRELOAD
 
 # Global variable to hold the loaded ONNX model instance
 onnx_gte_model = None
 
+def split_token_windows(ids: List[int], window: int, overlap: int, max_windows: Optional[int] = None) -> List[List[int]]:
+    """
+    Splits token ids into windows of at most `window` tokens, where consecutive
+    windows share `overlap` tokens. The last window always ends at the last token.
+    If there would be more than `max_windows` windows, that many are kept,
+    spread evenly over the text (first and last included), so long texts
+    are sampled throughout instead of losing their end.
+    """
+    if window <= 0:
+        raise ValueError("window must be positive")
+    if not 0 <= overlap < window:
+        raise ValueError("overlap must be in [0, window)")
+    if len(ids) <= window:
+        return [list(ids)]
+    step = window - overlap
+    starts = list(range(0, len(ids) - window, step)) + [len(ids) - window]
+    if max_windows is not None and len(starts) > max_windows:
+        keep = np.unique(np.linspace(0, len(starts) - 1, max(max_windows, 1)).round().astype(int))
+        starts = [starts[i] for i in keep]
+    return [list(ids[start:start + window]) for start in starts]
+
 class GTEOnnxModel:
     def __init__(self, model_dir: str, max_seq_length: int = 512):
         """
@@ -36,6 +58,16 @@ class GTEOnnxModel:
         self.tokenizer.enable_truncation(max_length=max_seq_length)
         self.max_seq_length = max_seq_length
 
+        # Second tokenizer without padding/truncation, used to split long texts into chunks
+        self.chunk_tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.chunk_tokenizer.no_padding()
+        self.chunk_tokenizer.no_truncation()
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        # Special tokens wrapped around an empty input, e.g. [CLS] [SEP] or <s> </s>
+        special_ids = self.chunk_tokenizer.encode("").ids
+        self.prefix_ids = special_ids[:1]
+        self.suffix_ids = special_ids[1:]
+
     def encode(self, text: str) -> np.ndarray:
         """
         Encodes a single text string into a normalized sentence embedding.
@@ -68,6 +100,34 @@ class GTEOnnxModel:
 
         return normalized_embedding
 
+    def encode_chunks(self, text: str, chunk_size: int = 128, overlap: int = 32,
+                      max_chunks: Optional[int] = None) -> np.ndarray:
+        """
+        Encodes overlapping token windows of the text in a single batched call.
+        Returns a (num_chunks, hidden_size) array of normalized CLS embeddings.
+        Batches are padded to the longest window only, not to max_seq_length.
+        """
+        content_ids = self.chunk_tokenizer.encode(text, add_special_tokens=False).ids
+        chunk_size = min(chunk_size, self.max_seq_length - len(self.prefix_ids) - len(self.suffix_ids))
+        windows = [
+            self.prefix_ids + window + self.suffix_ids
+            for window in split_token_windows(content_ids, chunk_size, min(overlap, chunk_size - 1), max_chunks)
+        ]
+
+        seq_length = max(len(window) for window in windows)
+        input_ids = np.full((len(windows), seq_length), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(windows), seq_length), dtype=np.int64)
+        for row, window in enumerate(windows):
+            input_ids[row, :len(window)] = window
+            attention_mask[row, :len(window)] = 1
+
+        outputs = self.sess.run(None, {'input_ids': input_ids, 'attention_mask': attention_mask})
+        cls_embeddings = outputs[0][:, 0, :]
+
+        norms = np.linalg.norm(cls_embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0 # Avoid division by zero
+        return cls_embeddings / norms
+
 def init_onnx_model():
     global onnx_gte_model
     try:
@@ -104,6 +164,48 @@ def get_embedding(text_input: str) -> Optional[List[float]]:
         # For now, returning None to indicate failure.
         return None
 
+def get_chunk_embeddings(text_input: str) -> Optional[Tuple[List[float], List[List[float]]]]:
+    """
+    Returns (document_embedding, chunk_embeddings) for the text.
+    The document embedding is the normalized mean of the chunk embeddings, so
+    no extra full-length forward pass is needed.
+    """
+    if onnx_gte_model is None:
+        print("Error: ONNX model is not available for embedding.")
+        return None
+    if not text_input:
+        print("Error: text_input for embedding cannot be empty.")
+        return None
+    try:
+        chunks_np = onnx_gte_model.encode_chunks(text_input, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, max_chunks=MAX_CHUNKS)
+        pooled = chunks_np.mean(axis=0)
+        norm = np.linalg.norm(pooled)
+        if norm != 0:
+            pooled = pooled / norm
+        return pooled.tolist(), chunks_np.tolist()
+    except Exception as e:
+        print(f"Error during chunk embedding generation: {e}")
+        return None
+
+@functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _cached_query_embedding(query: str) -> Tuple[float, ...]:
+    # Raises instead of returning None so failures are not cached
+    embedding = get_embedding(query)
+    if embedding is None:
+        raise ValueError("Embedding generation failed")
+    return tuple(embedding)
+
+def get_query_embedding(query: str) -> Optional[List[float]]:
+    """
+    Embeds a search query. Results are cached, since short queries repeat often
+    and each miss costs a full model forward pass.
+    """
+    try:
+        return list(_cached_query_embedding(query.strip()))
+    except ValueError:
+        return None
+
 # Initialize the model when this module is loaded.
 # This can also be done in a FastAPI startup event for more control.
-init_onnx_model()
\ No newline at end of file
+if ONNX_MODEL_PRELOAD:
+    init_onnx_model()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import CHUNK_SIZE, CHUNK_OVERLAP, MAX_CHUNKS, MAX_SEQ_LENGTH
+from .embedding import GTEOnnxModel
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "evaluation", "corpus.json")
+
+
+class ModelVariant:
+    """
+    One model configuration to evaluate: an exported model directory (as read
+    by GTEOnnxModel) plus the sequence length and embedding mode to use.
+    """
+
+    def __init__(self, name: str, model_dir: str, max_seq_length: int = MAX_SEQ_LENGTH, chunked: bool = False):
+        self.name = name
+        self.model_dir = model_dir
+        self.max_seq_length = max_seq_length
+        self.chunked = chunked
+
+    @classmethod
+    def parse(cls, spec: str) -> "ModelVariant":
+        """Parses NAME=DIR[@MAX_SEQ_LENGTH][+chunked], e.g. 'int8-256=models/int8@256'."""
+        name, _, rest = spec.partition("=")
+        if not name or not rest:
+            raise ValueError(f"Invalid variant '{spec}', expected NAME=DIR[@MAX_SEQ_LENGTH][+chunked]")
+        chunked = rest.endswith("+chunked")
+        rest = rest[:-len("+chunked")] if chunked else rest
+        model_dir, _, seq_length = rest.partition("@")
+        return cls(name, model_dir, int(seq_length) if seq_length else MAX_SEQ_LENGTH, chunked)
+
+    def load_encoder(self) -> Callable[[str], np.ndarray]:
+        model = GTEOnnxModel(model_dir=self.model_dir, max_seq_length=self.max_seq_length)
+        if not self.chunked:
+            return model.encode
+
+        def encode_pooled(text: str) -> np.ndarray:
+            # Same pooling as get_chunk_embeddings
+            pooled = model.encode_chunks(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, max_chunks=MAX_CHUNKS).mean(axis=0)
+            norm = np.linalg.norm(pooled)
+            return pooled / norm if norm else pooled
+        return encode_pooled
+
+
+def load_corpus(path: str = DEFAULT_CORPUS_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as corpus_file:
+        corpus = json.load(corpus_file)
+    corpus["texts"] = [f"{event['title']} {event['description']}".strip() for event in corpus["events"]]
+    return corpus
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB; 0 where /proc is not available."""
+    try:
+        with open("/proc/self/status", "r") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k most cosine-similar documents for each query, best first."""
+    scores = _normalize(query_vectors) @ _normalize(doc_vectors).T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def recall_at_k(baseline_top: np.ndarray, variant_top: np.ndarray) -> float:
+    """Mean fraction of each query's baseline top-k that the variant also retrieves in its top-k."""
+    overlaps = [len(set(expected) & set(found)) / len(expected) for expected, found in zip(baseline_top, variant_top)]
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+
+def cosine_drift(baseline: np.ndarray, variant: np.ndarray) -> Dict[str, float]:
+    """1 - cosine similarity between matching rows; None-valued if the dimensions differ."""
+    if baseline.shape != variant.shape:
+        return {"mean": None, "max": None}
+    drift = 1.0 - np.sum(_normalize(baseline) * _normalize(variant), axis=1)
+    return {"mean": float(drift.mean()), "max": float(drift.max())}
+
+
+def embed_all(encoder: Callable[[str], np.ndarray], texts: List[str]):
+    """Embeds texts one by one, like the ingest route does; returns (vectors, per-call latencies in seconds)."""
+    vectors, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        vectors.append(np.asarray(encoder(text), dtype=np.float32))
+        latencies.append(time.perf_counter() - start)
+    return np.stack(vectors), np.asarray(latencies)
+
+
+def evaluate_variant(name: str, encoder: Callable[[str], np.ndarray], corpus: Dict[str, Any], k: int = 5,
+                     baseline: Optional[Dict[str, Any]] = None, warmup: int = 2, load_rss_mb: float = 0.0) -> Dict[str, Any]:
+    """
+    Embeds the corpus texts and queries and reports speed and memory, plus
+    quality against the baseline result (see compare_to_baseline).
+    """
+    for text in corpus["texts"][:warmup]:
+        encoder(text)
+    rss_before = rss_mb()
+    doc_vectors, doc_latencies = embed_all(encoder, corpus["texts"])
+    query_vectors, query_latencies = embed_all(encoder, corpus["queries"])
+    latencies_ms = np.concatenate([doc_latencies, query_latencies]) * 1000.0
+
+    result = {
+        "name": name,
+        "dims": int(doc_vectors.shape[1]),
+        "throughput_docs_per_s": float(len(doc_latencies) / doc_latencies.sum()) if doc_latencies.sum() else None,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "max": float(latencies_ms.max())
+        },
+        "memory_mb": {
+            "model_load": load_rss_mb,
+            "encode_growth": max(rss_mb() - rss_before, 0.0),
+            "peak": peak_rss_mb()
+        },
+        "top_k": top_k(doc_vectors, query_vectors, k),
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors
+    }
+    return compare_to_baseline(result, baseline)
+
+
+def compare_to_baseline(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Adds recall@k of the baseline's top-k and cosine drift of the document and query vectors."""
+    if baseline is None:
+        result.update({"recall_at_k": 1.0, "doc_drift": {"mean": 0.0, "max": 0.0}, "query_drift": {"mean": 0.0, "max": 0.0}})
+    else:
+        result["recall_at_k"] = recall_at_k(baseline["top_k"], result["top_k"])
+        result["doc_drift"] = cosine_drift(baseline["doc_vectors"], result["doc_vectors"])
+        result["query_drift"] = cosine_drift(baseline["query_vectors"], result["query_vectors"])
+    return result
+
+
+def measure_variant(variant: "ModelVariant", corpus: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Loads and evaluates one variant; run() calls this in a fresh process per variant."""
+    rss_before = rss_mb()
+    encoder = variant.load_encoder()
+    load_rss = max(rss_mb() - rss_before, 0.0)
+    return evaluate_variant(variant.name, encoder, corpus, k=k, load_rss_mb=load_rss)
+
+
+def within_budget(result: Dict[str, Any], min_recall: float, max_drift: float) -> bool:
+    drift = result["doc_drift"]["mean"]
+    return result["recall_at_k"] >= min_recall and (drift is None or drift <= max_drift)
+
+
+def summarize(results: List[Dict[str, Any]], k: int, min_recall: float, max_drift: float) -> Dict[str, Any]:
+    """JSON-serializable report; recommends the fastest variant within the quality budget."""
+    report = []
+    for result in results:
+        entry = {key: value for key, value in result.items() if key not in ("top_k", "doc_vectors", "query_vectors")}
+        entry[f"recall_at_{k}"] = entry.pop("recall_at_k")
+        entry["within_budget"] = within_budget(result, min_recall, max_drift)
+        report.append(entry)
+    passing = [entry for entry in report if entry["within_budget"] and entry["throughput_docs_per_s"]]
+    fastest = max(passing, key=lambda entry: entry["throughput_docs_per_s"], default=None)
+    return {
+        "k": k,
+        "budget": {"min_recall": min_recall, "max_mean_drift": max_drift},
+        "variants": report,
+        "recommended": fastest["name"] if fastest else None
+    }
+
+
+def run(baseline: ModelVariant, variants: List[ModelVariant], corpus_path: str = DEFAULT_CORPUS_PATH, k: int = 5,
+        min_recall: float = 0.9, max_drift: float = 0.05) -> Dict[str, Any]:
+    """
+    Evaluates each variant in its own spawned process: ONNX Runtime does not
+    return its memory arena to the OS, so sharing a process would carry one
+    variant's memory over into the next one's numbers.
+    """
+    corpus = load_corpus(corpus_path)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    # Spawned workers import src.embedding while unpickling, before any pool initializer
+    # runs, so keep it from loading the service's model through their inherited environment
+    previous_preload = os.environ.get("ONNX_MODEL_PRELOAD")
+    os.environ["ONNX_MODEL_PRELOAD"] = "false"
+    try:
+        for variant in [baseline] + variants:
+            print(f"Evaluating variant '{variant.name}' from {variant.model_dir} (max_seq_length={variant.max_seq_length}, chunked={variant.chunked})...")
+            with context.Pool(1) as pool:
+                result = pool.apply(measure_variant, (variant, corpus, k))
+            results.append(compare_to_baseline(result, results[0] if results else None))
+    finally:
+        if previous_preload is None:
+            os.environ.pop("ONNX_MODEL_PRELOAD", None)
+        else:
+            os.environ["ONNX_MODEL_PRELOAD"] = previous_preload
+    return summarize(results, k, min_recall, max_drift)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare embedding model variants against an fp32 baseline.")
+    parser.add_argument("--baseline", required=True, help="Baseline variant, NAME=DIR[@MAX_SEQ_LENGTH][+chunked]")
+    parser.add_argument("--variant", action="append", default=[], help="Variant to compare (repeatable), same format")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_PATH)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Quality budget: minimum recall@k")
+    parser.add_argument("--max-drift", type=float, default=0.05, help="Quality budget: maximum mean cosine drift")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(ModelVariant.parse(args.baseline), [ModelVariant.parse(spec) for spec in args.variant],
+                 corpus_path=args.corpus, k=args.k, min_recall=args.min_recall, max_drift=args.max_drift)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
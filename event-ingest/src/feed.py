@@ -0,0 +1,257 @@
+import asyncio
+import numpy as np
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import (
+    INDEX_NAME, VECTOR_DIMENSIONS, FEED_TOPICS, FEED_MAX_ITEMS, FEED_REFRESH_SECONDS,
+    FEED_TIME_HALF_LIFE_DAYS, FEED_GEO_SCALE_KM,
+)
+from . import db
+from .embedding import get_embedding
+
+EARTH_RADIUS_KM = 6371.0
+# Geo weight for events without coordinates in a topic that has a center
+NO_GEO_WEIGHT = 0.5
+# Only these fields are needed to score an event
+FEED_SOURCE_FIELDS = ["id", "start_time", "location", "vector_embedding"]
+
+
+class Topic:
+    def __init__(self, name: str, vector: np.ndarray, lat: Optional[float] = None, lon: Optional[float] = None):
+        self.name = name
+        norm = np.linalg.norm(vector)
+        self.vector = (vector / norm if norm else vector).astype(np.float32)
+        self.lat = lat
+        self.lon = lon
+
+    @property
+    def has_center(self) -> bool:
+        return self.lat is not None and self.lon is not None
+
+
+def _parse_time(value: Optional[str]) -> float:
+    if not value:
+        return np.nan
+    parsed = datetime.fromisoformat(value)
+    # Read timestamps without an offset as UTC, like Elasticsearch and the storage range filter
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _event_arrays(documents: Iterable[Dict[str, Any]]):
+    """
+    Unpacks event documents into parallel arrays; events without an
+    embedding or start time are skipped.
+    """
+    ids, vectors, start_times, lats, lons = [], [], [], [], []
+    for doc in documents:
+        vector = doc.get("vector_embedding")
+        start_time = _parse_time(doc.get("start_time"))
+        if not vector or np.isnan(start_time):
+            continue
+        geo = (doc.get("location") or {}).get("geo") or {}
+        ids.append(doc["id"])
+        vectors.append(vector)
+        start_times.append(start_time)
+        lats.append(geo.get("lat", np.nan))
+        lons.append(geo.get("lon", np.nan))
+    return (
+        np.asarray(ids, dtype=object),
+        np.asarray(vectors, dtype=np.float32) if ids else np.empty((0, VECTOR_DIMENSIONS), dtype=np.float32),
+        np.asarray(start_times, dtype=np.float64),
+        np.asarray(lats, dtype=np.float64),
+        np.asarray(lons, dtype=np.float64),
+    )
+
+
+class FeedCache:
+    """
+    Ranked candidate lists per topic, stored as score-sorted NumPy arrays so a
+    page read is a slice. Scores combine centroid similarity, time decay and
+    geo distance: (1 + cosine) / 2 * 0.5 ** (days_until_start / half_life) * exp(-km / geo_scale).
+    """
+
+    def __init__(self, max_items: int = FEED_MAX_ITEMS, time_half_life_days: float = FEED_TIME_HALF_LIFE_DAYS,
+                 geo_scale_km: float = FEED_GEO_SCALE_KM):
+        self.max_items = max_items
+        self.time_half_life_days = time_half_life_days
+        self.geo_scale_km = geo_scale_km
+        self.topics: Dict[str, Topic] = {}
+        # topic -> (event ids, scores), both sorted by descending score
+        self.feeds: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # event id -> document (None if removed) changed while a rebuild runs
+        self._pending: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+
+    def set_topics(self, topics: Iterable[Topic]) -> None:
+        self.topics = {topic.name: topic for topic in topics}
+        self.feeds = {name: feed for name, feed in self.feeds.items() if name in self.topics}
+
+    def score(self, vectors: np.ndarray, start_times: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+              now: float) -> np.ndarray:
+        """Returns an (events, topics) score matrix; past events score -inf."""
+        topics = list(self.topics.values())
+        centroids = np.stack([topic.vector for topic in topics])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        similarity = (1.0 + (vectors / norms) @ centroids.T) / 2.0
+
+        days_until = (start_times - now) / 86400.0
+        time_weight = np.power(0.5, np.maximum(days_until, 0.0) / self.time_half_life_days)
+
+        geo_weight = np.ones_like(similarity)
+        centered = np.array([topic.has_center for topic in topics])
+        if centered.any():
+            center_lats = np.radians([topic.lat for topic in topics if topic.has_center])
+            center_lons = np.radians([topic.lon for topic in topics if topic.has_center])
+            event_lats = np.radians(lats)[:, None]
+            event_lons = np.radians(lons)[:, None]
+            # Haversine distance from every event to every topic center
+            a = (np.sin((event_lats - center_lats) / 2.0) ** 2
+                 + np.cos(event_lats) * np.cos(center_lats) * np.sin((event_lons - center_lons) / 2.0) ** 2)
+            distance_km = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+            weights = np.exp(-distance_km / self.geo_scale_km)
+            geo_weight[:, centered] = np.where(np.isnan(weights), NO_GEO_WEIGHT, weights)
+
+        scores = similarity * time_weight[:, None] * geo_weight
+        scores[days_until < 0] = -np.inf
+        return scores.astype(np.float32)
+
+    def rank(self, documents: Iterable[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Rescores all upcoming events against every topic in one matrix product; does not touch self.feeds."""
+        if not self.topics:
+            return {}
+        now = datetime.now(timezone.utc).timestamp() if now is None else now
+        ids, vectors, start_times, lats, lons = _event_arrays(documents)
+        if len(ids) == 0:
+            empty = (np.empty(0, dtype=object), np.empty(0, dtype=np.float32))
+            return {name: empty for name in self.topics}
+        feeds = {}
+        scores = self.score(vectors, start_times, lats, lons, now)
+        for column, name in enumerate(self.topics):
+            topic_scores = scores[:, column]
+            k = min(self.max_items, int(np.isfinite(topic_scores).sum()))
+            if k == 0:
+                feeds[name] = (np.empty(0, dtype=object), np.empty(0, dtype=np.float32))
+                continue
+            top = np.argpartition(-topic_scores, k - 1)[:k]
+            top = top[np.argsort(-topic_scores[top], kind="stable")]
+            feeds[name] = (ids[top], topic_scores[top])
+        return feeds
+
+    def rebuild(self, documents: Iterable[Dict[str, Any]], now: Optional[float] = None) -> None:
+        self.feeds = self.rank(documents, now)
+
+    def begin_rebuild(self) -> None:
+        """Starts recording incremental changes, so a rebuild running off the event loop does not lose them."""
+        self._pending = {}
+
+    def finish_rebuild(self, feeds: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]]) -> None:
+        """
+        Swaps in feeds computed by rank() and replays the changes made since
+        begin_rebuild(), which the scan may have missed. With feeds None
+        (the rebuild failed) the current feeds are kept.
+        """
+        pending, self._pending = self._pending, None
+        if feeds is None:
+            return
+        self.feeds = feeds
+        for event_id, document in (pending or {}).items():
+            if document is None:
+                self.remove_event(event_id)
+            else:
+                self.add_event(document)
+
+    def remove_event(self, event_id: str) -> None:
+        if self._pending is not None:
+            self._pending[event_id] = None
+        for name, (ids, scores) in self.feeds.items():
+            keep = ids != event_id
+            if not keep.all():
+                self.feeds[name] = (ids[keep], scores[keep])
+
+    def add_event(self, document: Dict[str, Any], now: Optional[float] = None) -> None:
+        """Scores one new or updated event and inserts it into each topic's ranking."""
+        self.remove_event(document.get("id"))
+        if self._pending is not None:
+            self._pending[document.get("id")] = document
+        if not self.topics:
+            return
+        now = datetime.now(timezone.utc).timestamp() if now is None else now
+        ids, vectors, start_times, lats, lons = _event_arrays([document])
+        if len(ids) == 0:
+            return
+        scores = self.score(vectors, start_times, lats, lons, now)[0]
+        for column, name in enumerate(self.topics):
+            score = scores[column]
+            if not np.isfinite(score):
+                continue
+            feed_ids, feed_scores = self.feeds.get(name, (np.empty(0, dtype=object), np.empty(0, dtype=np.float32)))
+            # Scores are descending, so search the negated array
+            position = int(np.searchsorted(-feed_scores, -score, side="right"))
+            if position >= self.max_items:
+                continue
+            feed_ids = np.insert(feed_ids, position, ids[0])[:self.max_items]
+            feed_scores = np.insert(feed_scores, position, score)[:self.max_items]
+            self.feeds[name] = (feed_ids, feed_scores)
+
+    def page(self, topic: str, offset: int = 0, size: int = 20) -> List[Tuple[str, float]]:
+        """Returns (event_id, score) pairs for one page of a topic feed."""
+        ids, scores = self.feeds.get(topic, (np.empty(0, dtype=object), np.empty(0, dtype=np.float32)))
+        return [(str(event_id), float(score)) for event_id, score in zip(ids[offset:offset + size], scores[offset:offset + size])]
+
+
+feed_cache = FeedCache()
+
+
+def load_topics(topic_config: Dict[str, Dict[str, Any]]) -> List[Topic]:
+    """Builds topics from FEED_TOPICS; topics whose centroid cannot be embedded are skipped."""
+    topics = []
+    for name, spec in topic_config.items():
+        vector = spec.get("vector")
+        if vector is None and spec.get("query"):
+            vector = get_embedding(spec["query"])
+        if vector is None:
+            print(f"Warning: Skipping feed topic '{name}': no centroid vector available.")
+            continue
+        topics.append(Topic(name, np.asarray(vector, dtype=np.float32), spec.get("lat"), spec.get("lon")))
+    return topics
+
+
+def _rank_upcoming(backend, now: datetime) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    if not backend.index_exists(INDEX_NAME):
+        return feed_cache.rank([], now.timestamp())
+    # Past events never make it into a feed, so leave them in storage
+    documents = backend.scan(INDEX_NAME, source_fields=FEED_SOURCE_FIELDS,
+                             range_filter={"start_time": {"gte": now.isoformat()}})
+    return feed_cache.rank(documents, now.timestamp())
+
+
+async def refresh_feeds() -> bool:
+    """
+    Rebuilds every topic feed from the upcoming events in storage. The scan
+    and scoring run in a worker thread; the new feeds are swapped in at once.
+    """
+    backend = db.get_storage_backend()
+    if backend is None:
+        print("Cannot refresh feeds: storage backend not available.")
+        return False
+    if len(feed_cache.topics) < len(FEED_TOPICS):
+        # Retry topics that could not be embedded earlier, e.g. before the model loaded
+        feed_cache.set_topics(await asyncio.to_thread(load_topics, FEED_TOPICS))
+    feeds = None
+    feed_cache.begin_rebuild()
+    try:
+        feeds = await asyncio.to_thread(_rank_upcoming, backend, datetime.now(timezone.utc))
+    finally:
+        feed_cache.finish_rebuild(feeds)
+    return True
+
+
+async def run_feed_refresher():
+    """Background job: periodic full rebuild; new events are added incrementally in between."""
+    while True:
+        try:
+            await refresh_feeds()
+        except Exception as e:
+            print(f"Error refreshing feeds: {e}")
+        await asyncio.sleep(FEED_REFRESH_SECONDS)
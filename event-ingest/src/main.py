@@ -1,12 +1,15 @@
+import asyncio
 from fastapi import FastAPI
 
 # Import the router from the routes module
 from .routes import router as events_router
 
 # Import initialization functions and global variables for status check
-from .db import init_es_client, ensure_events_index_exists, es_client
+from . import db
+from .db import init_storage_backend, ensure_events_index_exists
 from .embedding import init_onnx_model, onnx_gte_model
-from .config import APP_HOST, APP_PORT # For uvicorn command reference, not used directly here
+from .feed import run_feed_refresher
+from .config import APP_HOST, APP_PORT, FEED_TOPICS # APP_HOST/APP_PORT for uvicorn command reference, not used directly here
 
 app = FastAPI(title="Event Ingest Service")
 
@@ -14,9 +17,10 @@ app = FastAPI(title="Event Ingest Service")
 async def startup_event():
     """
     Actions to perform on application startup.
-    - Initialize Elasticsearch client.
+    - Initialize the storage backend (Elasticsearch client or in-memory store).
     - Initialize ONNX model.
     - Ensure the Elasticsearch index exists.
+    - Start the background job that rebuilds the topic feeds.
     """
     print("Application startup: Initializing resources...")
     # Initialize ES Client (idempotent, checks if already initialized)
@@ -25,8 +29,8 @@ async def startup_event():
     # and serves as a clear startup step.
     # If init_es_client were async, we would await it.
     # For now, assuming synchronous init is fine at module load or here.
-    if es_client is None: # Explicitly re-try init if it failed at module load
-        init_es_client()
+    if db.storage_backend is None: # Explicitly re-try init if it failed at module load
+        init_storage_backend()
 
     # Initialize ONNX Model (idempotent, checks if already initialized)
     # Similar to ES client, embedding module calls init_onnx_model() on import.
@@ -43,6 +47,10 @@ async def startup_event():
         print("FATAL: Elasticsearch index could not be ensured. Service may be impaired.")
     else:
         print("Elasticsearch index check complete.")
+
+    if FEED_TOPICS:
+        # Keep a reference so the task is not garbage collected
+        app.state.feed_refresher = asyncio.create_task(run_feed_refresher())
     print("Application startup complete.")
 
 
@@ -53,29 +61,32 @@ app.include_router(events_router) # Removed prefix to mount at root
 async def read_root():
     """
     Root endpoint for health check.
-    Provides status of critical components like ONNX model and Elasticsearch.
+    Provides status of critical components like ONNX model and the storage backend.
     """
     # Check ONNX model status (using the imported global variable)
     model_status = "ONNX model loaded" if onnx_gte_model else "ONNX model FAILED to load"
 
-    # Check Elasticsearch client status (using the imported global variable)
-    # Perform a ping to ensure connectivity if client exists
-    es_status = "Elasticsearch client FAILED to connect"
-    if es_client:
+    # Check storage backend status (read from the module so re-initialization is seen)
+    # Perform a ping to ensure connectivity if the backend exists
+    backend = db.storage_backend
+    storage_status = "Storage backend FAILED to initialize"
+    if backend:
         try:
-            if await es_client.ping():
-                es_status = "Elasticsearch client connected"
+            if backend.ping():
+                storage_status = f"{backend.name} connected"
             else:
-                es_status = "Elasticsearch client ping FAILED"
+                storage_status = f"{backend.name} ping FAILED"
         except Exception:
-            es_status = "Elasticsearch client ping EXCEPTION"
+            storage_status = f"{backend.name} ping EXCEPTION"
 
 
     return {
         "message": "Event Ingest Service is running.",
         "status": {
             "onnx_model": model_status,
-            "elasticsearch_client": es_status
+            "storage_backend": storage_status,
+            # Deprecated alias of storage_backend, kept so existing health checks keep working
+            "elasticsearch_client": storage_status
         }
     }
 
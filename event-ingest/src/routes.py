@@ -1,7 +1,8 @@
 from elasticsearch import ApiError
 from elasticsearch import ApiError
 import json
-from fastapi import APIRouter, HTTPException, status, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Form, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
 from typing import Optional
 
@@ -11,18 +12,46 @@ from typing import Optional
 # If PYTHONPATH issues arise, this might need adjustment in the Dockerfile or runtime environment.
 from generated_models import Event
 
-from .embedding import get_embedding
-from .db import index_event, ensure_events_index_exists, es_client
+from .embedding import get_embedding, get_chunk_embeddings, get_query_embedding
+from .config import CHUNK_EMBEDDINGS_ENABLED, HYBRID_LEXICAL_CANDIDATES, HYBRID_KNN_CANDIDATES
+from .db import VECTOR_FIELDS, index_event, event_document, delete_event, ensure_events_index_exists, get_storage_backend, hybrid_search_events
+from .config import INDEX_NAME, CHANGES_MAX_WAIT_SECONDS
+from .feed import feed_cache
+from .changes import change_log, stream_changes
 
 router = APIRouter()
 
+def public_event(document: dict) -> dict:
+    """Strips storage-only vector fields from an event document before returning it."""
+    document.pop("vector_embedding", None)
+    document.pop("vector_chunks", None)
+    return document
+
+def publish_change(op: str, event_id: str, document: Optional[dict] = None):
+    """
+    Updates the feed cache and appends to the change log after a write.
+    Each step is isolated, so a feed failure never drops a change log entry.
+    """
+    try:
+        # Keep precomputed feeds current between full rebuilds
+        if document is None:
+            feed_cache.remove_event(event_id)
+        else:
+            feed_cache.add_event(document)
+    except Exception as e:
+        print(f"Error updating feeds for event {event_id}: {e}")
+    try:
+        change_log.append(op, event_id, public_event(dict(document)) if document is not None else None)
+    except Exception as e:
+        print(f"Error appending event {event_id} to the change log: {e}")
+
 @router.post("/events", status_code=status.HTTP_201_CREATED, response_model=Event)
 async def create_event_endpoint(
     event_json_str: str = Form(..., alias='event', description="JSON string representing the Event object"),
     imageFile: UploadFile | None = File(None, description="Optional event image file")
 ):
-    if es_client is None:
-        # This check might be redundant if db.init_es_client() ensures es_client is always initialized
+    if get_storage_backend() is None:
+        # This check might be redundant if db.init_storage_backend() ensures a backend is always initialized
         # or raises an error that prevents the app from starting/handling requests.
         # However, it's a good safeguard.
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Elasticsearch service not available.")
@@ -57,11 +86,18 @@ async def create_event_endpoint(
     event_id = validated_event_dict.get("id", "UNKNOWN_ID") # Get ID for logging and ES document ID
 
     embedding = None
+    chunk_embeddings = None
     if not text_to_embed:
         print(f"Warning: Empty text for embedding for event ID {event_id}. Skipping embedding generation.")
     else:
         try:
-            embedding = get_embedding(text_to_embed) # Call the refactored function
+            if CHUNK_EMBEDDINGS_ENABLED:
+                # One batched call over short windows instead of a single max-length pass
+                result = get_chunk_embeddings(text_to_embed)
+                if result is not None:
+                    embedding, chunk_embeddings = result
+            else:
+                embedding = get_embedding(text_to_embed) # Call the refactored function
             if embedding is None:
                  print(f"Warning: Embedding generation returned None for event ID {event_id}.")
         except Exception as e: # Catching broad exception from get_embedding if it raises one
@@ -91,12 +127,131 @@ async def create_event_endpoint(
 
     # 5. Index to Elasticsearch
     try:
-        await index_event(event_model=validated_event) # Pass the Pydantic model instance
-        # Return the Pydantic model instance for response_model serialization
-        return validated_event
+        result = await index_event(event_model=validated_event, embedding=embedding, chunk_embeddings=chunk_embeddings) # Pass the Pydantic model instance
     except ApiError as e: # Correct exception type
         print(f"Elasticsearch API Error indexing event {validated_event.id}: {e}") # Use validated_event.id
         raise HTTPException(status_code=500, detail="Error storing event data.")
     except Exception as e: # Catch any other unexpected errors during indexing
         print(f"Unexpected error indexing event {event_id}: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred while indexing the event: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred while indexing the event: {str(e)}")
+
+    # 6. Publish the change. The event is already stored, so failures here are logged, not returned.
+    publish_change("updated" if result == "updated" else "created", validated_event.id, event_document(validated_event, embedding))
+    # Return the Pydantic model instance for response_model serialization
+    return validated_event
+
+@router.get("/feed/{topic}")
+async def get_feed_endpoint(
+    topic: str,
+    offset: int = Query(0, ge=0, description="Position of the first event in the ranked feed"),
+    size: int = Query(20, ge=1, le=100, description="Number of events to return")
+):
+    """
+    Serves one page of a precomputed topic feed. Only the events on the page
+    are fetched from storage, so reads do not grow with the index size.
+    """
+    if topic not in feed_cache.topics:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown feed topic '{topic}'.")
+    backend = get_storage_backend()
+    if backend is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Storage backend not available.")
+
+    ranked = feed_cache.page(topic, offset=offset, size=size)
+    documents = backend.mget(INDEX_NAME, [event_id for event_id, _ in ranked], source_excludes=VECTOR_FIELDS)
+    items = []
+    for (event_id, score), document in zip(ranked, documents):
+        if document is None:
+            continue # Deleted since the last rebuild
+        items.append({"score": score, "event": public_event(document)})
+
+    return {
+        "topic": topic,
+        "offset": offset,
+        "items": items,
+        "next_offset": offset + len(ranked) if len(ranked) == size else None
+    }
+
+@router.get("/events/search")
+async def search_events_endpoint(
+    q: str = Query(..., min_length=1, description="Search text"),
+    size: int = Query(10, ge=1, le=100, description="Number of events to return"),
+    lexical_candidates: int = Query(HYBRID_LEXICAL_CANDIDATES, ge=1, le=1000, description="Candidates taken from the BM25 leg"),
+    knn_candidates: int = Query(HYBRID_KNN_CANDIDATES, ge=1, le=1000, description="Candidates taken from the kNN leg")
+):
+    """
+    Hybrid search: BM25 and kNN legs fused with reciprocal rank fusion in one
+    storage round trip. Falls back to BM25 only if the query cannot be embedded.
+    """
+    if get_storage_backend() is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Storage backend not available.")
+
+    query_vector = get_query_embedding(q)
+    if query_vector is None:
+        print("Warning: Could not embed search query, using lexical search only.")
+
+    try:
+        hits = await hybrid_search_events(
+            q, query_vector, k=size,
+            lexical_candidates=lexical_candidates,
+            knn_candidates=knn_candidates
+        )
+    except ApiError as e:
+        print(f"Elasticsearch API Error searching events: {e}")
+        raise HTTPException(status_code=500, detail="Error searching events.")
+
+    return {
+        "query": q,
+        "mode": "hybrid" if query_vector is not None else "lexical",
+        "items": [{"score": hit["_score"], "event": public_event(hit["_source"])} for hit in hits]
+    }
+
+@router.get("/events/changes")
+async def get_changes_endpoint(
+    request: Request,
+    since: str = Query("", description="Cursor from a previous response; empty to start at the oldest retained change"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes to return"),
+    wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT_SECONDS, description="Seconds to long-poll when there are no new changes")
+):
+    """
+    Change stream of created, updated and deleted events.
+    Clients sending 'Accept: text/event-stream' get Server-Sent Events and resume
+    with the Last-Event-ID header; otherwise this is a long-poll JSON endpoint.
+    A 'reset' means changes after the cursor are no longer retained: rescan the
+    index and continue from the returned cursor. Cursors from another log,
+    e.g. from before a restart without CHANGE_LOG_PATH, also reset.
+    """
+    if "text/event-stream" in request.headers.get("accept", ""):
+        cursor = request.headers.get("last-event-id") or since
+        return StreamingResponse(
+            stream_changes(change_log, cursor, request.is_disconnected, CHANGES_MAX_WAIT_SECONDS, batch_size=limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"}
+        )
+
+    entries, reset = change_log.since(since, limit)
+    if not entries and not reset and wait > 0:
+        await change_log.wait(since, wait)
+        entries, reset = change_log.since(since, limit)
+
+    if reset:
+        return {"changes": [], "cursor": change_log.cursor(change_log.last_seq), "reset": True}
+    return {
+        "changes": entries,
+        "cursor": change_log.cursor(entries[-1]["seq"] if entries else change_log.parse_cursor(since)),
+        "reset": False
+    }
+
+@router.delete("/events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_event_endpoint(event_id: str):
+    if get_storage_backend() is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Storage backend not available.")
+    try:
+        deleted = await delete_event(event_id)
+    except ApiError as e:
+        print(f"Elasticsearch API Error deleting event {event_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error deleting event.")
+    if not deleted:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Event '{event_id}' not found.")
+
+    publish_change("deleted", event_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
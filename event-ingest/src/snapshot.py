@@ -0,0 +1,224 @@
+import argparse
+import os
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import INDEX_NAME, VECTOR_DIMENSIONS
+from .storage import StorageBackend
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy" # Per-vector scales, int8 snapshots only
+IDS_FILE = "ids.txt"
+SNAPSHOT_DTYPES = ("float32", "int8")
+# Fixed .npy header size, so appending only rewrites the shape in place
+NPY_HEADER_SIZE = 128
+# Vectors fetched per mget when appending
+MGET_BATCH_SIZE = 1000
+
+
+def _write_npy_header(npy_file, dtype: np.dtype, shape: Tuple[int, ...]) -> None:
+    header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+    prefix = np.lib.format.magic(1, 0) + np.uint16(NPY_HEADER_SIZE - 10).tobytes()
+    padded = header.ljust(NPY_HEADER_SIZE - len(prefix) - 1) + "\n"
+    if len(prefix) + len(padded) != NPY_HEADER_SIZE:
+        raise ValueError(f"Shape {shape} does not fit in the .npy header")
+    npy_file.seek(0)
+    npy_file.write(prefix + padded.encode("latin1"))
+
+
+def _append_rows(path: str, rows: np.ndarray) -> int:
+    """Appends rows to a fixed-header .npy file, creating it if needed. Returns the new row count."""
+    if not os.path.exists(path):
+        with open(path, "wb") as npy_file:
+            _write_npy_header(npy_file, rows.dtype, (0,) + rows.shape[1:])
+    existing = np.load(path, mmap_mode="r")
+    if existing.dtype != rows.dtype or existing.shape[1:] != rows.shape[1:]:
+        raise ValueError(f"Cannot append {rows.dtype}{rows.shape[1:]} rows to {existing.dtype}{existing.shape[1:]} file {path}")
+    committed_bytes = NPY_HEADER_SIZE + existing.nbytes
+    count = existing.shape[0] + rows.shape[0]
+    del existing
+    with open(path, "r+b") as npy_file:
+        # Data first, header last: the header row count is the commit point.
+        # Writing at the committed end discards bytes from an interrupted append.
+        npy_file.seek(committed_bytes)
+        npy_file.truncate()
+        npy_file.write(np.ascontiguousarray(rows).tobytes())
+        npy_file.flush()
+        _write_npy_header(npy_file, rows.dtype, (count,) + rows.shape[1:])
+    return count
+
+
+def _truncate_rows(path: str, count: int) -> None:
+    """Drops rows past count from a fixed-header .npy file, e.g. left by an interrupted append."""
+    existing = np.load(path, mmap_mode="r")
+    dtype, shape = existing.dtype, existing.shape
+    del existing
+    if shape[0] <= count:
+        return
+    row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+    with open(path, "r+b") as npy_file:
+        _write_npy_header(npy_file, dtype, (count,) + shape[1:])
+        npy_file.truncate(NPY_HEADER_SIZE + count * row_bytes)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization; returns (codes, scales) with vectors ~= codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class VectorSnapshot:
+    """
+    Read-only view of an exported snapshot. With mmap the vectors are
+    zero-copy views of the file, so opening does not depend on its size.
+    """
+
+    def __init__(self, ids: List[str], vectors: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.vectors = vectors
+        self.scales = scales
+        self._id_index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def id_index(self) -> Dict[str, int]:
+        if self._id_index is None:
+            self._id_index = {event_id: row for row, event_id in enumerate(self.ids)}
+        return self._id_index
+
+    def float_vectors(self, rows=slice(None)) -> np.ndarray:
+        """Returns float32 vectors for rows, dequantizing int8 snapshots (this copies)."""
+        if self.scales is None:
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        return self.vectors[rows].astype(np.float32) * self.scales[rows, None]
+
+
+def load_snapshot(directory: str, mmap: bool = True) -> VectorSnapshot:
+    mmap_mode = "r" if mmap else None
+    vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode=mmap_mode)
+    scales_path = os.path.join(directory, SCALES_FILE)
+    scales = np.load(scales_path, mmap_mode=mmap_mode)[:vectors.shape[0]] if os.path.exists(scales_path) else None
+    with open(os.path.join(directory, IDS_FILE), "r", encoding="utf-8") as ids_file:
+        # The vectors header is authoritative; ignore ids from an interrupted append
+        ids = ids_file.read().splitlines()[:vectors.shape[0]]
+    if len(ids) != vectors.shape[0]:
+        raise ValueError(f"Snapshot {directory} has {vectors.shape[0]} vectors but {len(ids)} ids")
+    return VectorSnapshot(ids, vectors, scales)
+
+
+def _batches(documents: Iterable[Dict], skip_ids: set, batch_size: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+    ids, rows = [], []
+    for doc in documents:
+        vector = doc.get("vector_embedding")
+        if not vector or doc.get("id") in skip_ids:
+            continue
+        ids.append(doc["id"])
+        rows.append(vector)
+        if len(ids) >= batch_size:
+            yield ids, np.asarray(rows, dtype=np.float32)
+            ids, rows = [], []
+    if ids:
+        yield ids, np.asarray(rows, dtype=np.float32)
+
+
+def _new_documents(backend: StorageBackend, index: str, skip_ids: set) -> Iterator[Dict]:
+    """
+    Scans ids only and fetches vectors for events missing from the snapshot,
+    so an append transfers vectors just for the new events.
+    """
+    pending = []
+    for doc in backend.scan(index, source_fields=["id"]):
+        if doc.get("id") in skip_ids:
+            continue
+        pending.append(doc["id"])
+        if len(pending) >= MGET_BATCH_SIZE:
+            yield from filter(None, backend.mget(index, pending, source_fields=["id", "vector_embedding"]))
+            pending = []
+    if pending:
+        # Events deleted since the scan come back as None
+        yield from filter(None, backend.mget(index, pending, source_fields=["id", "vector_embedding"]))
+
+
+def export_vectors(backend: StorageBackend, directory: str, dtype: str = "float32", append: bool = True,
+                   batch_size: int = 10000, index: str = INDEX_NAME) -> int:
+    """
+    Writes every event's vector_embedding into directory as a contiguous
+    .npy file plus an ids.txt sidecar (one id per line, same row order).
+    With no vectors to export the snapshot is empty but still loadable.
+    With append, only ids are scanned and vectors are fetched for events
+    not yet in the snapshot, so re-running only adds new events. Appending
+    never removes rows: deleted events stay in the snapshot, and re-embedded
+    events keep their old vector, until a full export.
+    Returns the number of vectors written.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}")
+    os.makedirs(directory, exist_ok=True)
+    vectors_path = os.path.join(directory, VECTORS_FILE)
+    scales_path = os.path.join(directory, SCALES_FILE)
+    ids_path = os.path.join(directory, IDS_FILE)
+
+    skip_ids = set()
+    if append and os.path.exists(vectors_path):
+        snapshot = load_snapshot(directory)
+        if snapshot.vectors.dtype != np.dtype(dtype):
+            raise ValueError(f"Snapshot {directory} is {snapshot.vectors.dtype}, cannot append {dtype}; use a full export")
+        # Sidecars are written before the vectors header, so trim anything an interrupted append left behind
+        with open(ids_path, "w", encoding="utf-8") as ids_file:
+            ids_file.write("".join(f"{event_id}\n" for event_id in snapshot.ids))
+        skip_ids = set(snapshot.ids)
+        count, has_scales = len(snapshot), snapshot.scales is not None
+        del snapshot # Release the memory maps before truncating
+        if has_scales:
+            _truncate_rows(scales_path, count)
+    else:
+        for path in (vectors_path, scales_path, ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if skip_ids:
+        documents = _new_documents(backend, index, skip_ids)
+    else:
+        documents = backend.scan(index, source_fields=["id", "vector_embedding"])
+    written = 0
+    for ids, vectors in _batches(documents, skip_ids, batch_size):
+        with open(ids_path, "a", encoding="utf-8") as ids_file:
+            ids_file.write("".join(f"{event_id}\n" for event_id in ids))
+        if dtype == "int8":
+            codes, scales = quantize_int8(vectors)
+            _append_rows(scales_path, scales)
+            _append_rows(vectors_path, codes)
+        else:
+            _append_rows(vectors_path, vectors)
+        written += len(ids)
+    if not os.path.exists(vectors_path):
+        # Nothing to export: still leave an empty, loadable snapshot
+        open(ids_path, "a", encoding="utf-8").close()
+        if dtype == "int8":
+            _append_rows(scales_path, np.empty(0, dtype=np.float32))
+        _append_rows(vectors_path, np.empty((0, VECTOR_DIMENSIONS), dtype=dtype))
+    print(f"Exported {written} vectors to {directory}.")
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export event embeddings to a memory-mappable snapshot.")
+    parser.add_argument("directory", help="Snapshot directory")
+    parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float32")
+    parser.add_argument("--full", action="store_true", help="Rewrite the snapshot instead of appending new events")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    from .db import get_storage_backend # Connects to storage on import
+    backend = get_storage_backend()
+    if backend is None:
+        raise SystemExit("Storage backend not available.")
+    export_vectors(backend, args.directory, dtype=args.dtype, append=not args.full, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import copy
+import math
+import re
+import operator
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from elasticsearch import ApiError, Elasticsearch, helpers
+
+RANGE_OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+
+
+def reciprocal_rank_fusion(legs: List[List[str]], rank_constant: int = 60, k: int = 10) -> List[Tuple[str, float]]:
+    """Fuses ranked id lists: score = sum of 1 / (rank_constant + rank) over the legs. Returns the top k (id, score) pairs."""
+    fused: Dict[str, float] = {}
+    for leg in legs:
+        for rank, doc_id in enumerate(leg, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rank_constant + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
+
+
+class StorageBackend(ABC):
+    """
+    Minimal document store interface used by db.py.
+    Implementations must support index, bulk, get and kNN vector search.
+    """
+
+    # Human-readable backend name for status reporting
+    name = "storage backend"
+
+    @abstractmethod
+    def ping(self) -> bool:
+        ...
+
+    @abstractmethod
+    def index_exists(self, index: str) -> bool:
+        ...
+
+    @abstractmethod
+    def create_index(self, index: str, mapping: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def put_mapping(self, index: str, properties: Dict[str, Any]) -> None:
+        """Adds field mappings to an existing index; fails if a field is already mapped differently."""
+        ...
+
+    @abstractmethod
+    def index(self, index: str, id: str, document: Dict[str, Any]) -> str:
+        """Stores the document and returns 'created' or 'updated'."""
+        ...
+
+    @abstractmethod
+    def delete(self, index: str, id: str) -> bool:
+        """Deletes the document; returns False if it did not exist."""
+        ...
+
+    @abstractmethod
+    def bulk(self, index: str, documents: Iterable[Dict[str, Any]], id_field: str = "id") -> int:
+        """
+        Indexes many documents at once, using document[id_field] as the document ID.
+        Returns the number of documents indexed.
+        """
+        ...
+
+    @abstractmethod
+    def get(self, index: str, id: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored document source, or None if it does not exist."""
+        ...
+
+    @abstractmethod
+    def mget(self, index: str, ids: List[str], source_fields: Optional[List[str]] = None,
+             source_excludes: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Returns the document sources in the order of ids, with None for missing ones,
+        optionally restricted to source_fields and without the top-level source_excludes.
+        """
+        ...
+
+    @abstractmethod
+    def scan(self, index: str, source_fields: Optional[List[str]] = None,
+             range_filter: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterates over every document source, optionally restricted to source_fields.
+        range_filter keeps only documents matching Elasticsearch-style range
+        bounds, e.g. {"start_time": {"gte": "2025-01-01T00:00:00+00:00"}}.
+        Bounds are numbers or ISO 8601 timestamps.
+        """
+        ...
+
+    @abstractmethod
+    def knn_search(self, index: str, field: str, query_vector: List[float], k: int = 10,
+                   num_candidates: Optional[int] = None,
+                   source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns up to k hits ordered by descending score.
+        Each hit is a dict with '_id', '_score' and '_source', as in an Elasticsearch response;
+        source_excludes drops top-level fields (e.g. the vectors) from '_source'.
+        A field inside a nested object list (e.g. 'vector_chunks.vector') scores
+        each document by its best matching entry.
+        """
+        ...
+
+    @abstractmethod
+    def hybrid_search(self, index: str, query_text: str, text_fields: List[str], vector_field: str,
+                      query_vector: Optional[List[float]], k: int = 10, lexical_candidates: int = 50,
+                      knn_candidates: int = 50, rank_constant: int = 60,
+                      source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Fuses a BM25 leg over text_fields and a kNN leg over vector_field with
+        reciprocal rank fusion: score = sum of 1 / (rank_constant + rank) over the legs.
+        Each leg contributes at most its candidate limit. Without a query_vector
+        only the lexical leg runs, with plain BM25 scores.
+        """
+        ...
+
+
+class ElasticsearchBackend(StorageBackend):
+    # Health reports "Elasticsearch client connected", as before the backends existed
+    name = "Elasticsearch client"
+
+    def __init__(self, client: Elasticsearch):
+        self.client = client
+
+    def ping(self) -> bool:
+        return bool(self.client.ping())
+
+    def index_exists(self, index: str) -> bool:
+        return bool(self.client.indices.exists(index=index))
+
+    def create_index(self, index: str, mapping: Dict[str, Any]) -> None:
+        self.client.indices.create(index=index, body=mapping)
+
+    def put_mapping(self, index: str, properties: Dict[str, Any]) -> None:
+        self.client.indices.put_mapping(index=index, properties=properties)
+
+    def index(self, index: str, id: str, document: Dict[str, Any]) -> str:
+        response = self.client.index(index=index, id=id, document=document)
+        return response["result"]
+
+    def delete(self, index: str, id: str) -> bool:
+        response = self.client.options(ignore_status=404).delete(index=index, id=id)
+        return response.get("result") == "deleted"
+
+    def bulk(self, index: str, documents: Iterable[Dict[str, Any]], id_field: str = "id") -> int:
+        actions = (
+            {"_index": index, "_id": doc[id_field], "_source": doc}
+            for doc in documents
+        )
+        success_count, _ = helpers.bulk(self.client, actions)
+        return success_count
+
+    def get(self, index: str, id: str) -> Optional[Dict[str, Any]]:
+        response = self.client.options(ignore_status=404).get(index=index, id=id)
+        if not response.get("found"):
+            return None
+        return response["_source"]
+
+    def mget(self, index: str, ids: List[str], source_fields: Optional[List[str]] = None,
+             source_excludes: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        if not ids:
+            return []
+        response = self.client.mget(index=index, ids=ids, source=source_fields, source_excludes=source_excludes)
+        return [doc["_source"] if doc.get("found") else None for doc in response["docs"]]
+
+    def scan(self, index: str, source_fields: Optional[List[str]] = None,
+             range_filter: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Dict[str, Any]]:
+        if range_filter:
+            query = {"query": {"bool": {"filter": [{"range": {field: bounds}} for field, bounds in range_filter.items()]}}}
+        else:
+            query = {"query": {"match_all": {}}}
+        if source_fields is not None:
+            query["_source"] = source_fields
+        for hit in helpers.scan(self.client, index=index, query=query):
+            yield hit["_source"]
+
+    def knn_search(self, index: str, field: str, query_vector: List[float], k: int = 10,
+                   num_candidates: Optional[int] = None,
+                   source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        response = self.client.search(
+            index=index,
+            knn={
+                "field": field,
+                "query_vector": query_vector,
+                "k": k,
+                "num_candidates": num_candidates or max(k * 10, 100),
+            },
+            size=k,
+            source_excludes=source_excludes,
+        )
+        return response["hits"]["hits"]
+
+    def hybrid_search(self, index: str, query_text: str, text_fields: List[str], vector_field: str,
+                      query_vector: Optional[List[float]], k: int = 10, lexical_candidates: int = 50,
+                      knn_candidates: int = 50, rank_constant: int = 60,
+                      source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        lexical_query = {"multi_match": {"query": query_text, "fields": text_fields}}
+        if query_vector is None:
+            response = self.client.search(index=index, query=lexical_query, size=k, source_excludes=source_excludes)
+            return response["hits"]["hits"]
+        # Every candidate of both legs carries its _source, so leave the vectors out
+        source = {"_source": {"excludes": source_excludes}} if source_excludes else {}
+        # Both legs go out in one msearch round trip and are fused here.
+        # The rrf retriever would fuse server-side, but it needs an Enterprise
+        # or trial license; this also keeps each leg's candidate limit independent.
+        response = self.client.msearch(searches=[
+            {"index": index},
+            {"query": lexical_query, "size": lexical_candidates, **source},
+            {"index": index},
+            {
+                "knn": {
+                    "field": vector_field,
+                    "query_vector": query_vector,
+                    "k": knn_candidates,
+                    "num_candidates": max(knn_candidates * 2, 100),
+                },
+                "size": knn_candidates,
+                **source,
+            },
+        ])
+        sources: Dict[str, Dict[str, Any]] = {}
+        legs = []
+        for leg in response["responses"]:
+            if "error" in leg:
+                raise ApiError(message=str(leg["error"]), meta=response.meta, body=leg)
+            hits = leg["hits"]["hits"]
+            sources.update((hit["_id"], hit["_source"]) for hit in hits)
+            legs.append([hit["_id"] for hit in hits])
+        return [
+            {"_id": doc_id, "_score": score, "_source": sources[doc_id]}
+            for doc_id, score in reciprocal_rank_fusion(legs, rank_constant, k)
+        ]
+
+
+class InMemoryBackend(StorageBackend):
+    """
+    Dict-backed stand-in for Elasticsearch, for tests and local benchmarking.
+    kNN search is brute force over a cached NumPy matrix and scores hits like
+    Elasticsearch's cosine similarity: (1 + cosine) / 2.
+    """
+
+    name = "in-memory storage"
+
+    def __init__(self):
+        self.indices: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.mappings: Dict[str, Dict[str, Any]] = {}
+        # (index, field) -> (ids, row owners, normalized matrix); dropped whenever the index changes
+        self._vector_cache: Dict[tuple, tuple] = {}
+
+    def ping(self) -> bool:
+        return True
+
+    def index_exists(self, index: str) -> bool:
+        return index in self.indices
+
+    def create_index(self, index: str, mapping: Dict[str, Any]) -> None:
+        if index in self.indices:
+            raise ValueError(f"Index '{index}' already exists")
+        self.indices[index] = {}
+        self.mappings[index] = mapping
+
+    def put_mapping(self, index: str, properties: Dict[str, Any]) -> None:
+        existing = self.mappings.setdefault(index, {}).setdefault("mappings", {}).setdefault("properties", {})
+        for field, definition in properties.items():
+            if field in existing and existing[field] != definition:
+                raise ValueError(f"Field '{field}' is already mapped differently in index '{index}'")
+            existing[field] = definition
+
+    def _docs(self, index: str) -> Dict[str, Dict[str, Any]]:
+        # Elasticsearch auto-creates indices on write, so do the same here
+        return self.indices.setdefault(index, {})
+
+    def _invalidate(self, index: str) -> None:
+        for key in [key for key in self._vector_cache if key[0] == index]:
+            del self._vector_cache[key]
+
+    def index(self, index: str, id: str, document: Dict[str, Any]) -> str:
+        docs = self._docs(index)
+        result = "updated" if id in docs else "created"
+        docs[id] = copy.deepcopy(document)
+        self._invalidate(index)
+        return result
+
+    def delete(self, index: str, id: str) -> bool:
+        docs = self.indices.get(index, {})
+        if id not in docs:
+            return False
+        del docs[id]
+        self._invalidate(index)
+        return True
+
+    def bulk(self, index: str, documents: Iterable[Dict[str, Any]], id_field: str = "id") -> int:
+        docs = self._docs(index)
+        count = 0
+        for doc in documents:
+            docs[doc[id_field]] = copy.deepcopy(doc)
+            count += 1
+        self._invalidate(index)
+        return count
+
+    def get(self, index: str, id: str) -> Optional[Dict[str, Any]]:
+        doc = self.indices.get(index, {}).get(id)
+        return copy.deepcopy(doc) if doc is not None else None
+
+    @staticmethod
+    def _source(doc: Dict[str, Any], source_fields: Optional[List[str]] = None,
+                source_excludes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Copies only the requested top-level fields, so excluded vectors are never copied."""
+        fields = doc.keys() if source_fields is None else [field for field in source_fields if field in doc]
+        return {field: copy.deepcopy(doc[field]) for field in fields if field not in (source_excludes or ())}
+
+    def mget(self, index: str, ids: List[str], source_fields: Optional[List[str]] = None,
+             source_excludes: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        docs = self.indices.get(index, {})
+        return [
+            self._source(docs[id], source_fields, source_excludes) if id in docs else None
+            for id in ids
+        ]
+
+    @staticmethod
+    def _range_value(value: Any) -> float:
+        if isinstance(value, str):
+            parsed = datetime.fromisoformat(value)
+            # Elasticsearch reads timestamps without an offset as UTC
+            return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+        return float(value)
+
+    @classmethod
+    def _in_range(cls, doc: Dict[str, Any], range_filter: Dict[str, Dict[str, Any]]) -> bool:
+        for field, bounds in range_filter.items():
+            if doc.get(field) is None:
+                return False
+            value = cls._range_value(doc[field])
+            for op, bound in bounds.items():
+                if not RANGE_OPERATORS[op](value, cls._range_value(bound)):
+                    return False
+        return True
+
+    def scan(self, index: str, source_fields: Optional[List[str]] = None,
+             range_filter: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Dict[str, Any]]:
+        for doc in list(self.indices.get(index, {}).values()):
+            if range_filter and not self._in_range(doc, range_filter):
+                continue
+            if source_fields is None:
+                yield copy.deepcopy(doc)
+            else:
+                yield {field: copy.deepcopy(doc[field]) for field in source_fields if field in doc}
+
+    @staticmethod
+    def _field_vectors(doc: Dict[str, Any], field: str) -> List[List[float]]:
+        path, _, rest = field.partition(".")
+        value = doc.get(path)
+        if not rest:
+            return [value] if value else []
+        if isinstance(value, dict):
+            value = [value]
+        vectors = []
+        for item in value or []:
+            vectors.extend(InMemoryBackend._field_vectors(item, rest))
+        return vectors
+
+    def _vectors(self, index: str, field: str):
+        key = (index, field)
+        if key not in self._vector_cache:
+            ids, owners, rows = [], [], []
+            for doc_id, doc in self.indices.get(index, {}).items():
+                vectors = self._field_vectors(doc, field)
+                if vectors:
+                    owners.extend([len(ids)] * len(vectors))
+                    ids.append(doc_id)
+                    rows.extend(vectors)
+            if not rows:
+                # Nothing to search yet; don't cache, the next write invalidates anyway
+                return [], np.empty(0, dtype=np.intp), np.empty((0, 0), dtype=np.float32)
+            matrix = np.asarray(rows, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._vector_cache[key] = (ids, np.asarray(owners, dtype=np.intp), matrix / norms)
+        return self._vector_cache[key]
+
+    def knn_search(self, index: str, field: str, query_vector: List[float], k: int = 10,
+                   num_candidates: Optional[int] = None,
+                   source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        ids, owners, matrix = self._vectors(index, field)
+        if not ids or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        row_scores = (1.0 + matrix @ (query / norm)) / 2.0
+        if len(row_scores) == len(ids):
+            scores = row_scores
+        else:
+            # Several rows per document: keep each document's best row
+            scores = np.full(len(ids), -np.inf, dtype=row_scores.dtype)
+            np.maximum.at(scores, owners, row_scores)
+        k = min(k, len(ids))
+        # argpartition is O(n); only the top k are fully sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        docs = self.indices[index]
+        return [
+            {"_id": ids[i], "_score": float(scores[i]), "_source": self._source(docs[ids[i]], source_excludes=source_excludes)}
+            for i in top
+        ]
+
+    @staticmethod
+    def _tokens(value: Any) -> List[str]:
+        return re.findall(r"\w+", value.lower()) if isinstance(value, str) else []
+
+    def _bm25(self, index: str, query_text: str, text_fields: List[str], k1: float = 1.2, b: float = 0.75) -> Dict[str, float]:
+        """
+        BM25 per field over the whole index; a document scores its best field,
+        like a best_fields multi_match.
+        """
+        docs = self.indices.get(index, {})
+        terms = set(self._tokens(query_text))
+        scores: Dict[str, float] = {}
+        if not terms or not docs:
+            return scores
+        for field in text_fields:
+            field_tokens = {doc_id: self._tokens(doc.get(field)) for doc_id, doc in docs.items()}
+            average_length = sum(len(tokens) for tokens in field_tokens.values()) / len(docs) or 1.0
+            document_frequency = Counter(term for tokens in field_tokens.values() for term in set(tokens) & terms)
+            for doc_id, tokens in field_tokens.items():
+                counts = Counter(token for token in tokens if token in terms)
+                if not counts:
+                    continue
+                score = 0.0
+                for term, frequency in counts.items():
+                    idf = math.log(1.0 + (len(docs) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                    score += idf * frequency * (k1 + 1.0) / (frequency + k1 * (1.0 - b + b * len(tokens) / average_length))
+                scores[doc_id] = max(scores.get(doc_id, 0.0), score)
+        return scores
+
+    def hybrid_search(self, index: str, query_text: str, text_fields: List[str], vector_field: str,
+                      query_vector: Optional[List[float]], k: int = 10, lexical_candidates: int = 50,
+                      knn_candidates: int = 50, rank_constant: int = 60,
+                      source_excludes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        lexical = sorted(self._bm25(index, query_text, text_fields).items(), key=lambda item: -item[1])
+        docs = self.indices.get(index, {})
+        if query_vector is None:
+            return [
+                {"_id": doc_id, "_score": score, "_source": self._source(docs[doc_id], source_excludes=source_excludes)}
+                for doc_id, score in lexical[:k]
+            ]
+
+        legs = [
+            [doc_id for doc_id, _ in lexical[:lexical_candidates]],
+            [hit["_id"] for hit in self.knn_search(index, vector_field, query_vector, k=knn_candidates,
+                                                   source_excludes=source_excludes)],
+        ]
+        return [
+            {"_id": doc_id, "_score": score, "_source": self._source(docs[doc_id], source_excludes=source_excludes)}
+            for doc_id, score in reciprocal_rank_fusion(legs, rank_constant, k)
+        ]
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run the service against the in-memory storage backend; no Elasticsearch needed.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+# generated_models.py and the src package live in the event-ingest directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+
+from src.changes import ChangeLog, stream_changes
+
+
+def test_since_returns_entries_after_cursor():
+    log = ChangeLog(max_entries=10)
+    for i in range(5):
+        log.append("created", f"evt_{i}")
+
+    entries, reset = log.since(log.cursor(2), limit=2)
+    assert not reset
+    assert [entry["seq"] for entry in entries] == [3, 4]
+    assert log.since(log.cursor(5)) == ([], False)
+
+
+def test_evicted_or_unknown_cursor_requires_reset():
+    log = ChangeLog(max_entries=3)
+    for i in range(5):
+        log.append("created", f"evt_{i}")
+
+    assert log.since("") == ([], True) # Entries 1 and 2 were evicted
+    assert [entry["seq"] for entry in log.since(log.cursor(2))[0]] == [3, 4, 5]
+    assert log.since(log.cursor(99)) == ([], True) # Sequence this log never reached
+
+
+def test_cursor_from_another_log_requires_reset():
+    previous = ChangeLog()
+    previous.append("created", "evt_1")
+    restarted = ChangeLog()
+    restarted.append("created", "evt_2")
+    restarted.append("created", "evt_3")
+
+    # Same sequence number, different log: must not resume at evt_3
+    assert restarted.since(previous.cursor(1)) == ([], True)
+    assert restarted.since("1") == ([], True)
+
+
+def test_unknown_operation_is_rejected():
+    with pytest.raises(ValueError):
+        ChangeLog().append("renamed", "evt_1")
+
+
+def test_log_is_restored_from_file(tmp_path):
+    path = str(tmp_path / "changes.jsonl")
+    log = ChangeLog(path=path)
+    log.append("created", "evt_1", {"id": "evt_1"})
+    log.append("deleted", "evt_1")
+
+    restored = ChangeLog(path=path)
+    assert restored.log_id == log.log_id # Cursors survive the restart
+    assert restored.last_seq == 2
+    assert restored.append("created", "evt_2")["seq"] == 3
+    assert [entry["op"] for entry in restored.since(log.cursor(0))[0]] == ["created", "deleted", "created"]
+
+
+@pytest.mark.asyncio
+async def test_wait_wakes_on_append():
+    log = ChangeLog()
+    waiter = asyncio.create_task(log.wait(log.cursor(0), timeout=5))
+    await asyncio.sleep(0)
+    log.append("created", "evt_1")
+    await asyncio.wait_for(waiter, 1)
+
+
+@pytest.mark.asyncio
+async def test_stream_changes_emits_resumable_events():
+    log = ChangeLog()
+    log.append("created", "evt_1")
+    log.append("updated", "evt_1")
+
+    disconnected = False
+    async def is_disconnected():
+        return disconnected
+
+    stream = stream_changes(log, log.cursor(1), is_disconnected, wait_seconds=0.01)
+    first = await stream.__anext__()
+    assert first.startswith(f"id: {log.cursor(2)}\nevent: updated\n")
+    assert await stream.__anext__() == ": keep-alive\n\n"
+    disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
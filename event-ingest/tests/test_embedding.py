@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+
+from src import embedding
+from src.embedding import GTEOnnxModel, split_token_windows
+
+WORDS = "a b c d e f g h".split()
+
+
+class StubSession:
+    """Returns a hidden state whose CLS row encodes the first content token, and records inputs."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def run(self, _, model_input):
+        self.inputs.append(model_input)
+        input_ids = model_input["input_ids"]
+        hidden = np.zeros(input_ids.shape + (len(WORDS),), dtype=np.float32)
+        for row, ids in enumerate(input_ids):
+            hidden[row, 0, ids[1] - 4] = 3.0
+        return [hidden]
+
+
+@pytest.fixture
+def stub_model(tmp_path, monkeypatch):
+    vocab = {"[PAD]": 0, "[CLS]": 1, "[SEP]": 2, "[UNK]": 3, **{word: 4 + i for i, word in enumerate(WORDS)}}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 1), ("[SEP]", 2)]
+    )
+    (tmp_path / "tokenizer").mkdir()
+    tokenizer.save(str(tmp_path / "tokenizer" / "tokenizer.json"))
+    (tmp_path / "model.onnx").write_bytes(b"")
+    session = StubSession()
+    monkeypatch.setattr(embedding.ort, "InferenceSession", lambda *args, **kwargs: session)
+    model = GTEOnnxModel(str(tmp_path), max_seq_length=16)
+    return model, session
+
+
+def test_short_input_is_a_single_window():
+    assert split_token_windows([1, 2, 3], window=4, overlap=1) == [[1, 2, 3]]
+
+
+def test_windows_overlap_and_cover_the_tail():
+    windows = split_token_windows(list(range(10)), window=4, overlap=1)
+    assert windows == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]
+
+    windows = split_token_windows(list(range(11)), window=4, overlap=1)
+    assert windows[-1] == [7, 8, 9, 10]
+    assert all(len(window) == 4 for window in windows)
+
+
+def test_max_windows_spreads_windows_over_the_whole_text():
+    windows = split_token_windows(list(range(100)), window=10, overlap=2, max_windows=3)
+    assert len(windows) == 3
+    assert windows[0][0] == 0
+    assert windows[-1][-1] == 99 # The end of the text is still covered
+    assert 0 < windows[1][0] < 90
+
+
+def test_invalid_overlap_is_rejected():
+    with pytest.raises(ValueError):
+        split_token_windows([1, 2, 3], window=4, overlap=4)
+
+
+def test_query_embeddings_are_cached_but_failures_are_not(monkeypatch):
+    from src import embedding
+
+    calls = []
+    def fake_get_embedding(text):
+        calls.append(text)
+        return None if text == "broken" else [0.5, 0.5]
+
+    monkeypatch.setattr(embedding, "get_embedding", fake_get_embedding)
+    embedding._cached_query_embedding.cache_clear()
+
+    assert embedding.get_query_embedding("poetry ") == [0.5, 0.5]
+    assert embedding.get_query_embedding("poetry") == [0.5, 0.5]
+    assert embedding.get_query_embedding("broken") is None
+    assert embedding.get_query_embedding("broken") is None
+    assert calls == ["poetry", "broken", "broken"]
+    embedding._cached_query_embedding.cache_clear()
+
+
+def test_encode_chunks_batches_short_padded_windows(stub_model):
+    model, session = stub_model
+    chunks = model.encode_chunks("a b c d e", chunk_size=3, overlap=1)
+
+    batch = session.inputs[-1]
+    # Windows [a b c] and [c d e], each wrapped in [CLS] ... [SEP]: length 5, not max_seq_length 16
+    assert batch["input_ids"].tolist() == [[1, 4, 5, 6, 2], [1, 6, 7, 8, 2]]
+    assert batch["attention_mask"].tolist() == [[1] * 5, [1] * 5]
+    assert chunks.shape == (2, len(WORDS))
+    np.testing.assert_allclose(np.linalg.norm(chunks, axis=1), 1.0)
+
+    # A text shorter than one window is a single sequence at its own length
+    model.encode_chunks("a b", chunk_size=3, overlap=1)
+    batch = session.inputs[-1]
+    assert batch["input_ids"].tolist() == [[1, 4, 5, 2]]
+    assert batch["attention_mask"].tolist() == [[1, 1, 1, 1]]
+
+
+def test_get_chunk_embeddings_pools_normalized_mean(stub_model, monkeypatch):
+    model, _ = stub_model
+    monkeypatch.setattr(embedding, "onnx_gte_model", model)
+    monkeypatch.setattr(embedding, "CHUNK_SIZE", 3)
+    monkeypatch.setattr(embedding, "CHUNK_OVERLAP", 1)
+
+    pooled, chunks = embedding.get_chunk_embeddings("a b c d e")
+
+    assert len(chunks) == 2
+    expected = np.array(chunks).mean(axis=0)
+    np.testing.assert_allclose(pooled, expected / np.linalg.norm(expected), rtol=1e-6)
+    assert embedding.get_chunk_embeddings("") is None
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pytest
+
+from src.evaluation import (
+    ModelVariant, cosine_drift, evaluate_variant, load_corpus, recall_at_k, run, summarize, top_k,
+)
+
+
+def hashed_encoder(dims=16, noise=0.0):
+    """Deterministic bag-of-words encoder standing in for the ONNX model."""
+    rng = np.random.default_rng(0)
+    def encode(text):
+        vector = np.zeros(dims, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dims] += 1.0
+        if noise:
+            vector += rng.normal(scale=noise, size=dims).astype(np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+    return encode
+
+
+class HashedVariant(ModelVariant):
+    """Module-level so spawned evaluation workers can unpickle it."""
+
+    def load_encoder(self):
+        return hashed_encoder(noise=0.5 if self.chunked else 0.0)
+
+
+def test_bundled_corpus_is_multilingual_and_unique():
+    corpus = load_corpus()
+    ids = [event["id"] for event in corpus["events"]]
+    assert len(ids) == len(set(ids))
+    assert len(corpus["texts"]) == len(ids)
+    assert {event_id.split("_")[1] for event_id in ids} >= {"en", "da", "de", "es", "fr", "ja"}
+    assert corpus["queries"]
+
+
+def test_bundled_corpus_has_descriptions_longer_than_the_model_window():
+    corpus = load_corpus()
+    # Well past 512 tokens, so @256 and +chunked variants see truncation
+    long_events = [event for event in corpus["events"] if "_long_" in event["id"] and len(event["description"]) > 2000]
+    assert {event["id"].split("_")[1] for event in long_events} >= {"en", "de", "es", "fr"}
+
+
+def test_variant_spec_parsing():
+    variant = ModelVariant.parse("int8-256=models/int8@256+chunked")
+    assert (variant.name, variant.model_dir, variant.max_seq_length, variant.chunked) == ("int8-256", "models/int8", 256, True)
+    assert ModelVariant.parse("fp32=models/fp32").chunked is False
+    with pytest.raises(ValueError):
+        ModelVariant.parse("models/fp32")
+
+
+def test_metrics():
+    docs = np.eye(4, dtype=np.float32)
+    queries = np.array([[1.0, 0.1, 0, 0], [0, 0, 0.2, 1.0]], dtype=np.float32)
+    assert top_k(docs, queries, 2).tolist() == [[0, 1], [3, 2]]
+    assert recall_at_k(np.array([[0, 1], [3, 2]]), np.array([[1, 0], [3, 1]])) == pytest.approx(0.75)
+    assert cosine_drift(docs, docs) == {"mean": pytest.approx(0.0), "max": pytest.approx(0.0)}
+    assert cosine_drift(docs, docs[:, :2])["mean"] is None
+
+
+def test_identical_variant_has_no_drift_and_noisy_variant_does():
+    corpus = load_corpus()
+    baseline = evaluate_variant("fp32", hashed_encoder(), corpus, k=3)
+    same = evaluate_variant("copy", hashed_encoder(), corpus, k=3, baseline=baseline)
+    noisy = evaluate_variant("noisy", hashed_encoder(noise=0.5), corpus, k=3, baseline=baseline)
+
+    assert same["recall_at_k"] == 1.0
+    assert same["doc_drift"]["mean"] == pytest.approx(0.0, abs=1e-6)
+    assert noisy["doc_drift"]["mean"] > 0.05
+    assert noisy["latency_ms"]["p95"] >= noisy["latency_ms"]["p50"]
+
+    report = summarize([baseline, same, noisy], k=3, min_recall=0.9, max_drift=0.05)
+    json.dumps(report) # The report must be serializable
+    budget = {entry["name"]: entry["within_budget"] for entry in report["variants"]}
+    assert budget == {"fp32": True, "copy": True, "noisy": False}
+    assert report["recommended"] in ("fp32", "copy")
+    assert "recall_at_3" in report["variants"][0]
+
+
+def test_run_measures_each_variant_in_its_own_process(monkeypatch):
+    monkeypatch.setenv("ONNX_MODEL_PRELOAD", "true")
+    report = run(HashedVariant("fp32", "unused"), [HashedVariant("noisy", "unused", chunked=True)], k=3)
+    # Only the workers skip the preload; the caller's environment is restored
+    assert os.environ["ONNX_MODEL_PRELOAD"] == "true"
+
+    variants = {entry["name"]: entry for entry in report["variants"]}
+    assert variants["fp32"]["recall_at_3"] == 1.0
+    assert variants["noisy"]["doc_drift"]["mean"] > 0.05
+    assert all(entry["memory_mb"]["peak"] > 0 for entry in report["variants"])
+    assert report["recommended"] == "fp32"
@@ -0,0 +1,183 @@
+import httpx
+import time
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from src import db, feed
+from src.config import INDEX_NAME
+from src.feed import FeedCache, Topic
+from src.main import app
+from src.storage import InMemoryBackend
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def make_doc(event_id, vector, days_ahead, geo=None):
+    return {
+        "id": event_id,
+        "start_time": (NOW + timedelta(days=days_ahead)).isoformat().replace("+00:00", "Z"),
+        "location": {"name": "Somewhere", "geo": geo},
+        "vector_embedding": vector,
+    }
+
+
+def make_cache(**kwargs):
+    cache = FeedCache(**kwargs)
+    cache.set_topics([
+        Topic("poetry", np.array([1.0, 0.0, 0.0])),
+        Topic("copenhagen", np.array([0.0, 1.0, 0.0]), lat=55.68, lon=12.57),
+    ])
+    return cache
+
+
+def test_naive_start_times_are_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        assert feed._parse_time("2025-06-01T00:00:00") == NOW.timestamp()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_rebuild_ranks_by_similarity_time_and_distance():
+    cache = make_cache()
+    cache.rebuild([
+        make_doc("poem_soon", [1.0, 0.0, 0.0], 1),
+        make_doc("poem_later", [1.0, 0.0, 0.0], 3),
+        make_doc("cph_local", [0.0, 1.0, 0.0], 1, {"lat": 55.68, "lon": 12.57}),
+        make_doc("cph_far", [0.0, 1.0, 0.0], 1, {"lat": 40.71, "lon": -74.0}),
+        make_doc("past", [1.0, 0.0, 0.0], -1),
+    ], now=NOW.timestamp())
+
+    poetry = [event_id for event_id, _ in cache.page("poetry", size=10)]
+    assert poetry[:2] == ["poem_soon", "poem_later"]
+    assert "past" not in poetry
+
+    copenhagen = [event_id for event_id, _ in cache.page("copenhagen", size=10)]
+    assert copenhagen[0] == "cph_local"
+    assert copenhagen.index("cph_local") < copenhagen.index("cph_far")
+
+
+def test_add_event_keeps_order_and_limit():
+    cache = make_cache(max_items=3)
+    cache.rebuild([make_doc(f"evt_{i}", [1.0, 0.0, 0.0], i + 1) for i in range(3)], now=NOW.timestamp())
+
+    cache.add_event(make_doc("evt_new", [1.0, 0.0, 0.0], 0.5), now=NOW.timestamp())
+    assert [event_id for event_id, _ in cache.page("poetry")] == ["evt_new", "evt_0", "evt_1"]
+
+    # Updating an event replaces its previous entry
+    cache.add_event(make_doc("evt_new", [1.0, 0.0, 0.0], 2.5), now=NOW.timestamp())
+    assert [event_id for event_id, _ in cache.page("poetry")] == ["evt_0", "evt_1", "evt_new"]
+
+
+def test_events_without_vector_or_start_time_are_skipped():
+    cache = make_cache()
+    cache.rebuild([{"id": "evt_unembedded", "start_time": NOW.isoformat(), "vector_embedding": None}], now=NOW.timestamp())
+    assert cache.page("poetry") == []
+    cache.add_event({"id": "evt_undated", "vector_embedding": [1.0, 0.0, 0.0]}, now=NOW.timestamp())
+    assert cache.page("poetry") == []
+
+
+@pytest.mark.asyncio
+async def test_refresh_on_empty_or_missing_index_clears_feeds(monkeypatch):
+    backend = InMemoryBackend()
+    monkeypatch.setattr(db, "storage_backend", backend)
+    cache = make_cache()
+    cache.rebuild([make_doc("evt_started", [1.0, 0.0, 0.0], 1)], now=NOW.timestamp())
+    monkeypatch.setattr(feed, "feed_cache", cache)
+
+    assert await feed.refresh_feeds() # Index does not exist yet
+    assert cache.page("poetry") == []
+    backend.create_index(INDEX_NAME, {})
+    assert await feed.refresh_feeds()
+    assert cache.page("poetry") == []
+
+
+def test_page_slices_the_ranking():
+    cache = make_cache()
+    cache.rebuild([make_doc(f"evt_{i}", [1.0, 0.0, 0.0], i + 1) for i in range(5)], now=NOW.timestamp())
+    assert [event_id for event_id, _ in cache.page("poetry", offset=2, size=2)] == ["evt_2", "evt_3"]
+    assert cache.page("unknown") == []
+
+
+def test_finish_rebuild_replays_changes_made_during_the_rebuild():
+    def upcoming(event_id, days_ahead):
+        # Replayed events are scored against the real clock
+        doc = make_doc(event_id, [1.0, 0.0, 0.0], 0)
+        doc["start_time"] = (datetime.now(timezone.utc) + timedelta(days=days_ahead)).isoformat()
+        return doc
+
+    cache = make_cache()
+    cache.rebuild([upcoming("evt_old", 1)])
+    cache.begin_rebuild()
+    # The scan has already passed these events
+    feeds = cache.rank([upcoming("evt_old", 1), upcoming("evt_gone", 2)])
+    cache.add_event(upcoming("evt_new", 3))
+    cache.remove_event("evt_gone")
+    assert [event_id for event_id, _ in cache.page("poetry")] == ["evt_old", "evt_new"]
+
+    cache.finish_rebuild(feeds)
+    assert {event_id for event_id, _ in cache.page("poetry")} == {"evt_old", "evt_new"}
+
+
+def test_failed_rebuild_keeps_current_feeds():
+    cache = make_cache()
+    cache.rebuild([make_doc("evt_old", [1.0, 0.0, 0.0], 1)], now=NOW.timestamp())
+    cache.begin_rebuild()
+    cache.finish_rebuild(None)
+    assert [event_id for event_id, _ in cache.page("poetry")] == ["evt_old"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_scans_only_upcoming_events(monkeypatch):
+    backend = InMemoryBackend()
+    monkeypatch.setattr(db, "storage_backend", backend)
+    cache = make_cache()
+    monkeypatch.setattr(feed, "feed_cache", cache)
+    now = datetime.now(timezone.utc)
+    for event_id, delta in (("evt_past", -1), ("evt_soon", 1)):
+        doc = make_doc(event_id, [1.0, 0.0, 0.0], 0)
+        doc["start_time"] = (now + timedelta(days=delta)).isoformat()
+        backend.index(INDEX_NAME, event_id, doc)
+    scanned = []
+    original_scan = backend.scan
+
+    def recording_scan(*args, **kwargs):
+        for doc in original_scan(*args, **kwargs):
+            scanned.append(doc["id"])
+            yield doc
+    monkeypatch.setattr(backend, "scan", recording_scan)
+
+    assert await feed.refresh_feeds()
+    assert scanned == ["evt_soon"]
+    assert [event_id for event_id, _ in cache.page("poetry")] == ["evt_soon"]
+
+
+@pytest.mark.asyncio
+async def test_feed_endpoint_serves_events_from_cache(monkeypatch):
+    backend = InMemoryBackend()
+    monkeypatch.setattr(db, "storage_backend", backend)
+    cache = make_cache()
+    monkeypatch.setattr(feed, "feed_cache", cache)
+    monkeypatch.setattr("src.routes.feed_cache", cache)
+
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    for i in range(3):
+        doc = make_doc(f"evt_{i}", [1.0, 0.0, 0.0], 0)
+        doc["start_time"] = (start + timedelta(days=i)).isoformat()
+        backend.index(INDEX_NAME, doc["id"], doc)
+    await feed.refresh_feeds()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.get("/feed/poetry", params={"size": 2})
+        missing = await client.get("/feed/nowhere")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["event"]["id"] for item in body["items"]] == ["evt_0", "evt_1"]
+    assert "vector_embedding" not in body["items"][0]["event"]
+    assert body["next_offset"] == 2
+    assert missing.status_code == 404
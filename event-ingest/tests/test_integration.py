@@ -1,91 +1,236 @@
 import pytest
-import pytest_asyncio
 import httpx
 import uuid
 import json
-import time
-from elasticsearch import AsyncElasticsearch
-# Assuming generated_models is accessible, adjust path if needed
-# Might need to add event-ingest to PYTHONPATH when running tests
-from event_ingest.generated_models import Event, Location, Geo, OrganizerInfo, Media
 
-SERVICE_URL = "http://localhost:8081"  # event-ingest-test service
-ES_URL = "http://localhost:9201"       # elasticsearch-test service
-INDEX_NAME = "events"
+from src import db, routes
+from src.changes import ChangeLog
+from src.main import app
+from src.config import INDEX_NAME, VECTOR_DIMENSIONS
+from src.storage import InMemoryBackend
+
+SERVICE_URL = "http://testserver"
+
+
+def make_event_dict(event_id: str) -> dict:
+    return {
+        "version": "1.0.0",
+        "id": event_id,
+        "title": "Integration Test Event",
+        "description": "Testing the event creation pipeline.",
+        "start_time": "2025-06-01T10:00:00Z",
+        "end_time": "2025-06-01T12:00:00Z",
+        "location": {
+            "name": "Test Location",
+            "address": "123 Test St, Test City",
+            "geo": {"lat": 55.68, "lon": 12.57}
+        },
+        "organizer_info": {
+            "name": "Test Org",
+            "contact_email": "org@example.com"
+        },
+        "signature": "0xdeadbeef",
+        "media": {"type": "image", "value": "http://example.com/image.jpg"}
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_storage(monkeypatch):
+    backend = InMemoryBackend()
+    monkeypatch.setattr(db, "storage_backend", backend)
+    # Deterministic embedding so the pipeline can be exercised without the ONNX model
+    monkeypatch.setattr(routes, "get_embedding", lambda text: [1.0] + [0.0] * (VECTOR_DIMENSIONS - 1))
+    monkeypatch.setattr(routes, "get_query_embedding", lambda text: [1.0] + [0.0] * (VECTOR_DIMENSIONS - 1))
+    monkeypatch.setattr(routes, "change_log", ChangeLog())
+    return backend
+
+
+async def post_event(event_dict: dict) -> httpx.Response:
+    files = {'event': (None, json.dumps(event_dict), 'application/json')}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        return await client.post("/events", files=files)
+
 
 @pytest.mark.asyncio
-async def test_create_event_successful():
-    event_id = str(uuid.uuid4())
-    test_event = Event(
-        id=event_id,
-        title="Integration Test Event",
-        description="Testing the event creation pipeline.",
-        start_time="2025-06-01T10:00:00Z",
-        end_time="2025-06-01T12:00:00Z", # Added based on typical event structure
-        event_source_url="http://example.com/event", # Added based on typical event structure
-        location=Location(
-            name="Test Location",
-            address="123 Test St, Test City", # Added for completeness
-            geo=Geo(lat=0.0, lon=0.0)
-        ),
-        organizer_info=OrganizerInfo(
-            name="Test Org",
-            description="A test organizer.", # Added for completeness
-            email="org@example.com" # Added for completeness
-        ),
-        tags=["test", "integration"],
-        media=[Media(url="http://example.com/image.jpg", type="image")],
-        # Ensure all required fields from openapi.yml schema are included
-        # For example, if 'category' or 'status' are required, add them.
-        # Assuming 'action_links' and 'related_links' are optional for now.
-        category="Test Category", # Added example required field
-        status="confirmed" # Added example required field
-    )
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{SERVICE_URL}/events", json=test_event.model_dump(by_alias=True))
-
-    assert response.status_code == 200  # Or 201 if your API returns that
+async def test_create_event_successful(fresh_storage):
+    event_id = f"evt_{uuid.uuid4()}"
+    test_event = make_event_dict(event_id)
+
+    response = await post_event(test_event)
+
+    assert response.status_code == 201
     response_data = response.json()
-    assert response_data["message"] == "Event created successfully"
-    assert response_data["event_id"] == event_id
-
-    # Allow time for indexing
-    time.sleep(2)
-
-    es_client = AsyncElasticsearch([ES_URL])
-    try:
-        es_response = await es_client.get(index=INDEX_NAME, id=event_id)
-        assert es_response["found"] is True
-        assert es_response["_id"] == event_id
-        assert es_response["_source"]["title"] == test_event.title
-        assert es_response["_source"]["id"] == event_id
-        assert es_response["_source"]["location"]["name"] == test_event.location.name
-        assert es_response["_source"]["vector_embedding"] is not None # Check embedding exists
-        # Add more assertions for other fields as needed
-        assert es_response["_source"]["category"] == test_event.category
-        assert es_response["_source"]["organizerInfo"]["name"] == test_event.organizer_info.name
-
-    finally:
-        await es_client.close()
+    assert response_data["id"] == event_id
+    assert response_data["title"] == test_event["title"]
+    assert response_data.get("vector_embedding") is None # Stored, not echoed back
+
+    stored = fresh_storage.get(index=INDEX_NAME, id=event_id)
+    assert stored is not None
+    assert stored["id"] == event_id
+    assert stored["title"] == test_event["title"]
+    assert stored["location"]["name"] == test_event["location"]["name"]
+    assert stored["organizer_info"]["name"] == test_event["organizer_info"]["name"]
+    assert len(stored["vector_embedding"]) == VECTOR_DIMENSIONS # Check embedding exists
+
+    hits = await db.search_similar_events(stored["vector_embedding"], k=1)
+    assert hits[0]["_id"] == event_id
+
+
 @pytest.mark.asyncio
-async def test_create_event_invalid_data():
+async def test_create_event_invalid_data(fresh_storage):
     invalid_event_dict = {
         # Missing 'title', 'description', etc.
         "id": str(uuid.uuid4()),
         "start_time": "not-a-date"
     }
-    event_json_str = json.dumps(invalid_event_dict)
-
-    # Prepare multipart data
-    files = {'event': (None, event_json_str, 'application/json')}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{SERVICE_URL}/events", files=files)
+    response = await post_event(invalid_event_dict)
 
-    # FastAPI typically returns 422 for Pydantic validation errors
-    assert response.status_code == 422
+    # The route validates the JSON form field itself and returns 400
+    assert response.status_code == 400
     response_data = response.json()
     assert "detail" in response_data # Check for FastAPI's error detail structure
-    # Optionally, assert specific details about the validation error
-    # print(response_data) # For debugging the exact error structure
\ No newline at end of file
+    assert fresh_storage.get(index=INDEX_NAME, id=invalid_event_dict["id"]) is None
+
+
+@pytest.mark.asyncio
+async def test_search_on_empty_storage_returns_no_items(fresh_storage):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        response = await client.get("/events/search", params={"q": "poetry"})
+
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_search_events_hybrid(fresh_storage):
+    event_id = f"evt_{uuid.uuid4()}"
+    assert (await post_event(make_event_dict(event_id))).status_code == 201
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        response = await client.get("/events/search", params={"q": "pipeline", "size": 5})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["mode"] == "hybrid"
+    assert [item["event"]["id"] for item in body["items"]] == [event_id]
+    assert "vector_embedding" not in body["items"][0]["event"]
+
+
+@pytest.mark.asyncio
+async def test_changes_record_create_update_and_delete(fresh_storage):
+    event_id = f"evt_{uuid.uuid4()}"
+    event_dict = make_event_dict(event_id)
+    assert (await post_event(event_dict)).status_code == 201
+    event_dict["title"] = "Renamed Event"
+    assert (await post_event(event_dict)).status_code == 201
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        assert (await client.delete(f"/events/{event_id}")).status_code == 204
+        assert (await client.delete(f"/events/{event_id}")).status_code == 404
+
+        first = (await client.get("/events/changes", params={"limit": 2})).json()
+        rest = (await client.get("/events/changes", params={"since": first["cursor"], "wait": 0.01})).json()
+        idle = (await client.get("/events/changes", params={"since": rest["cursor"], "wait": 0.01})).json()
+
+    assert [(change["op"], change["id"]) for change in first["changes"]] == [("created", event_id), ("updated", event_id)]
+    assert first["changes"][1]["event"]["title"] == "Renamed Event"
+    assert "vector_embedding" not in first["changes"][1]["event"]
+    assert [change["op"] for change in rest["changes"]] == ["deleted"]
+    assert idle == {"changes": [], "cursor": rest["cursor"], "reset": False}
+    assert fresh_storage.get(index=INDEX_NAME, id=event_id) is None
+
+
+@pytest.mark.asyncio
+async def test_change_is_logged_even_if_feed_update_fails(fresh_storage, monkeypatch):
+    def broken_add_event(document):
+        raise RuntimeError("feed scoring failed")
+    monkeypatch.setattr(routes.feed_cache, "add_event", broken_add_event)
+    event_id = f"evt_{uuid.uuid4()}"
+
+    response = await post_event(make_event_dict(event_id))
+
+    assert response.status_code == 201
+    assert fresh_storage.get(index=INDEX_NAME, id=event_id) is not None
+    assert [entry["id"] for entry in routes.change_log.since("")[0]] == [event_id]
+
+
+@pytest.mark.asyncio
+async def test_changes_cursor_from_previous_log_resets(fresh_storage, monkeypatch):
+    previous_cursor = routes.change_log.cursor(0)
+    monkeypatch.setattr(routes, "change_log", ChangeLog()) # e.g. a restart without CHANGE_LOG_PATH
+    assert (await post_event(make_event_dict(f"evt_{uuid.uuid4()}"))).status_code == 201
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        body = (await client.get("/events/changes", params={"since": previous_cursor})).json()
+
+    assert body == {"changes": [], "cursor": routes.change_log.cursor(1), "reset": True}
+
+
+@pytest.mark.asyncio
+async def test_health_reports_active_backend(fresh_storage):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        response = await client.get("/")
+
+    assert response.json()["status"]["storage_backend"] == "in-memory storage connected"
+    assert response.json()["status"]["elasticsearch_client"] == "in-memory storage connected" # Deprecated alias
+
+
+@pytest.mark.asyncio
+async def test_create_event_with_chunk_embeddings(fresh_storage, monkeypatch):
+    pooled = [0.0, 1.0] + [0.0] * (VECTOR_DIMENSIONS - 2)
+    chunks = [[1.0] + [0.0] * (VECTOR_DIMENSIONS - 1), pooled]
+    monkeypatch.setattr(routes, "CHUNK_EMBEDDINGS_ENABLED", True)
+    monkeypatch.setattr(routes, "get_chunk_embeddings", lambda text: (pooled, chunks))
+    event_id = f"evt_{uuid.uuid4()}"
+
+    assert (await post_event(make_event_dict(event_id))).status_code == 201
+
+    stored = fresh_storage.get(index=INDEX_NAME, id=event_id)
+    assert stored["vector_embedding"] == pooled
+    assert stored["vector_chunks"] == [{"vector": vector} for vector in chunks]
+    hits = await db.search_similar_events(chunks[0], k=1, use_chunks=True)
+    assert hits[0]["_id"] == event_id
+
+
+@pytest.mark.asyncio
+async def test_existing_index_gets_the_chunk_mapping(fresh_storage, monkeypatch):
+    monkeypatch.setattr(db, "chunk_mapping_checked", False)
+    fresh_storage.create_index(INDEX_NAME, {"mappings": {"properties": {"id": {"type": "keyword"}}}})
+
+    assert await db.ensure_events_index_exists()
+    properties = fresh_storage.mappings[INDEX_NAME]["mappings"]["properties"]
+    assert properties["vector_chunks"]["type"] == "nested"
+
+
+@pytest.mark.asyncio
+async def test_chunk_mode_is_refused_on_an_incompatible_mapping(fresh_storage, monkeypatch):
+    monkeypatch.setattr(db, "chunk_mapping_checked", False)
+    monkeypatch.setattr(db, "CHUNK_EMBEDDINGS_ENABLED", True)
+    # As dynamically mapped by Elasticsearch from a chunked event
+    fresh_storage.create_index(INDEX_NAME, {"mappings": {"properties": {"vector_chunks": {"properties": {"vector": {"type": "float"}}}}}})
+
+    assert not await db.ensure_events_index_exists()
+    assert (await post_event(make_event_dict(f"evt_{uuid.uuid4()}"))).status_code == 500
+
+
+@pytest.mark.asyncio
+async def test_read_endpoints_report_missing_storage_backend(monkeypatch):
+    monkeypatch.setattr(db, "storage_backend", None)
+    monkeypatch.setattr(routes.feed_cache, "topics", {"poetry": None})
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url=SERVICE_URL) as client:
+        responses = [
+            await client.get("/events/search", params={"q": "poetry"}),
+            await client.get("/feed/poetry"),
+            await client.delete("/events/evt_1"),
+        ]
+
+    assert [response.status_code for response in responses] == [503, 503, 503]
+    assert {response.json()["detail"] for response in responses} == {"Storage backend not available."}
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from src.config import VECTOR_DIMENSIONS
+from src.snapshot import NPY_HEADER_SIZE, export_vectors, load_snapshot, quantize_int8
+from src.storage import InMemoryBackend
+
+INDEX = "events"
+
+
+def make_backend(vectors, start=0):
+    backend = InMemoryBackend()
+    add_events(backend, vectors, start)
+    return backend
+
+
+def add_events(backend, vectors, start=0):
+    backend.bulk(INDEX, [
+        {"id": f"evt_{start + i}", "vector_embedding": vector.tolist()} for i, vector in enumerate(vectors)
+    ])
+
+
+def test_export_and_load_float32(tmp_path):
+    vectors = np.random.default_rng(0).normal(size=(25, 8)).astype(np.float32)
+    backend = make_backend(vectors)
+    backend.index(INDEX, "no_vector", {"id": "no_vector", "vector_embedding": None})
+
+    assert export_vectors(backend, str(tmp_path), batch_size=10, index=INDEX) == 25
+
+    snapshot = load_snapshot(str(tmp_path))
+    assert isinstance(snapshot.vectors, np.memmap)
+    assert snapshot.vectors.shape == (25, 8)
+    assert snapshot.ids == [f"evt_{i}" for i in range(25)]
+    np.testing.assert_array_equal(snapshot.vectors[snapshot.id_index["evt_7"]], vectors[7])
+    # Plain np.load reads the file as well
+    np.testing.assert_array_equal(np.load(tmp_path / "vectors.npy"), vectors)
+
+
+def test_append_only_adds_new_events(tmp_path):
+    rng = np.random.default_rng(1)
+    first, second = rng.normal(size=(5, 4)).astype(np.float32), rng.normal(size=(3, 4)).astype(np.float32)
+    backend = make_backend(first)
+    export_vectors(backend, str(tmp_path), index=INDEX)
+
+    add_events(backend, second, start=5)
+    assert export_vectors(backend, str(tmp_path), index=INDEX) == 3
+    assert export_vectors(backend, str(tmp_path), index=INDEX) == 0
+
+    snapshot = load_snapshot(str(tmp_path))
+    np.testing.assert_array_equal(snapshot.vectors, np.vstack([first, second]))
+    assert (tmp_path / "vectors.npy").stat().st_size == NPY_HEADER_SIZE + 8 * 4 * 4
+
+
+def test_append_recovers_from_interrupted_write(tmp_path):
+    vectors = np.eye(3, dtype=np.float32)
+    backend = make_backend(vectors[:2])
+    export_vectors(backend, str(tmp_path), index=INDEX)
+    # Simulate a crash after the ids and data were written but before the header
+    with open(tmp_path / "ids.txt", "a") as ids_file:
+        ids_file.write("evt_orphan\n")
+    with open(tmp_path / "vectors.npy", "ab") as npy_file:
+        npy_file.write(b"\x00" * 7)
+
+    add_events(backend, vectors[2:], start=2)
+    export_vectors(backend, str(tmp_path), index=INDEX)
+
+    snapshot = load_snapshot(str(tmp_path))
+    assert snapshot.ids == ["evt_0", "evt_1", "evt_2"]
+    np.testing.assert_array_equal(snapshot.vectors, vectors)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_export_with_no_vectors_leaves_a_loadable_snapshot(tmp_path, dtype):
+    backend = InMemoryBackend()
+    backend.index(INDEX, "no_vector", {"id": "no_vector", "vector_embedding": None})
+
+    assert export_vectors(backend, str(tmp_path), dtype=dtype, index=INDEX) == 0
+
+    snapshot = load_snapshot(str(tmp_path))
+    assert len(snapshot) == 0
+    assert snapshot.vectors.shape == (0, VECTOR_DIMENSIONS)
+    assert snapshot.float_vectors().shape == (0, VECTOR_DIMENSIONS)
+
+    # Later exports append to the empty snapshot
+    add_events(backend, np.ones((2, VECTOR_DIMENSIONS), dtype=np.float32))
+    assert export_vectors(backend, str(tmp_path), dtype=dtype, index=INDEX) == 2
+    assert load_snapshot(str(tmp_path)).ids == ["evt_0", "evt_1"]
+
+
+def test_int8_snapshot_dequantizes_close_to_original(tmp_path):
+    vectors = np.random.default_rng(2).normal(size=(50, 16)).astype(np.float32)
+    export_vectors(make_backend(vectors), str(tmp_path), dtype="int8", index=INDEX)
+
+    snapshot = load_snapshot(str(tmp_path))
+    assert snapshot.vectors.dtype == np.int8
+    np.testing.assert_allclose(snapshot.float_vectors(), vectors, atol=np.abs(vectors).max() / 127)
+
+    with pytest.raises(ValueError):
+        export_vectors(make_backend(vectors), str(tmp_path), dtype="float32", index=INDEX)
+
+
+def test_quantize_int8_handles_zero_vectors():
+    codes, scales = quantize_int8(np.zeros((2, 3), dtype=np.float32))
+    assert not codes.any()
+    assert np.all(scales == 1.0)
+
+
+def test_append_fetches_vectors_only_for_new_events(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    backend = make_backend(rng.normal(size=(4, 4)).astype(np.float32))
+    export_vectors(backend, str(tmp_path), index=INDEX)
+    add_events(backend, rng.normal(size=(2, 4)).astype(np.float32), start=4)
+    backend.delete(INDEX, "evt_0")
+
+    scanned_fields, fetched = [], []
+    original_scan, original_mget = backend.scan, backend.mget
+
+    def recording_scan(index, source_fields=None, **kwargs):
+        scanned_fields.append(source_fields)
+        return original_scan(index, source_fields, **kwargs)
+
+    def recording_mget(index, ids, source_fields=None):
+        fetched.extend(ids)
+        return original_mget(index, ids, source_fields)
+    monkeypatch.setattr(backend, "scan", recording_scan)
+    monkeypatch.setattr(backend, "mget", recording_mget)
+
+    assert export_vectors(backend, str(tmp_path), index=INDEX) == 2
+    assert scanned_fields == [["id"]]
+    assert sorted(fetched) == ["evt_4", "evt_5"]
+    # Appending never removes rows; deleted events stay until a full export
+    assert "evt_0" in load_snapshot(str(tmp_path)).ids
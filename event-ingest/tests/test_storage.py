@@ -0,0 +1,182 @@
+import numpy as np
+import pytest
+
+from unittest.mock import MagicMock
+
+from src.storage import ElasticsearchBackend, InMemoryBackend, StorageBackend
+
+INDEX = "events"
+
+
+def test_incomplete_backend_cannot_be_instantiated():
+    class PingOnlyBackend(StorageBackend):
+        def ping(self):
+            return True
+
+    with pytest.raises(TypeError):
+        PingOnlyBackend()
+
+
+def test_index_and_get_return_copies():
+    backend = InMemoryBackend()
+    doc = {"id": "evt_1", "title": "Poetry night"}
+    backend.index(INDEX, "evt_1", doc)
+    doc["title"] = "changed"
+
+    stored = backend.get(INDEX, "evt_1")
+    assert stored == {"id": "evt_1", "title": "Poetry night"}
+    assert backend.get(INDEX, "missing") is None
+
+
+def test_create_index_twice_fails():
+    backend = InMemoryBackend()
+    backend.create_index(INDEX, {"mappings": {}})
+    assert backend.index_exists(INDEX)
+    with pytest.raises(ValueError):
+        backend.create_index(INDEX, {"mappings": {}})
+
+
+def test_bulk_and_knn_search_matches_brute_force():
+    backend = InMemoryBackend()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    docs = [{"id": f"evt_{i}", "vector_embedding": v.tolist()} for i, v in enumerate(vectors)]
+    docs.append({"id": "evt_no_vector", "vector_embedding": None})
+
+    assert backend.bulk(INDEX, docs) == len(docs)
+
+    query = rng.normal(size=16).astype(np.float32)
+    hits = backend.knn_search(INDEX, "vector_embedding", query.tolist(), k=5)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+    assert [hit["_id"] for hit in hits] == [f"evt_{i}" for i in expected]
+    assert all(0.0 <= hit["_score"] <= 1.0 for hit in hits)
+    assert hits[0]["_score"] >= hits[-1]["_score"]
+
+
+def test_knn_search_sees_new_documents():
+    backend = InMemoryBackend()
+    backend.index(INDEX, "a", {"id": "a", "vector_embedding": [1.0, 0.0]})
+    assert backend.knn_search(INDEX, "vector_embedding", [0.0, 1.0], k=1)[0]["_id"] == "a"
+
+    backend.index(INDEX, "b", {"id": "b", "vector_embedding": [0.0, 1.0]})
+    assert backend.knn_search(INDEX, "vector_embedding", [0.0, 1.0], k=1)[0]["_id"] == "b"
+
+
+def test_knn_search_on_nested_field_scores_best_chunk():
+    backend = InMemoryBackend()
+    backend.index(INDEX, "long", {"id": "long", "vector_chunks": [
+        {"vector": [1.0, 0.0, 0.0]},
+        {"vector": [0.0, 0.0, 1.0]},
+    ]})
+    backend.index(INDEX, "short", {"id": "short", "vector_chunks": [{"vector": [0.6, 0.8, 0.0]}]})
+    backend.index(INDEX, "none", {"id": "none", "vector_chunks": None})
+
+    hits = backend.knn_search(INDEX, "vector_chunks.vector", [0.0, 0.0, 1.0], k=3)
+
+    assert [hit["_id"] for hit in hits] == ["long", "short"]
+    assert hits[0]["_score"] == pytest.approx(1.0)
+
+
+def test_hybrid_search_fuses_lexical_and_vector_legs():
+    backend = InMemoryBackend()
+    backend.bulk(INDEX, [
+        {"id": "lexical", "title": "Poetry slam", "description": "Open mic poetry", "vector_embedding": [0.0, 1.0]},
+        {"id": "both", "title": "Poetry reading", "description": "Quiet evening", "vector_embedding": [1.0, 0.0]},
+        {"id": "vector", "title": "Digtoplæsning", "description": "Aften med digte", "vector_embedding": [0.9, 0.1]},
+        {"id": "neither", "title": "Techno", "description": "All night", "vector_embedding": [-1.0, 0.0]},
+    ])
+
+    lexical_only = backend.hybrid_search(INDEX, "poetry", ["title", "description"], "vector_embedding", None, k=10)
+    assert {hit["_id"] for hit in lexical_only} == {"lexical", "both"}
+
+    hits = backend.hybrid_search(INDEX, "poetry", ["title", "description"], "vector_embedding", [1.0, 0.0],
+                                 k=3, lexical_candidates=2, knn_candidates=2, rank_constant=60)
+    ids = [hit["_id"] for hit in hits]
+    assert ids[0] == "both" # Ranked by both legs
+    assert set(ids) == {"both", "lexical", "vector"}
+    assert hits[0]["_score"] > hits[1]["_score"] >= hits[2]["_score"]
+
+
+def test_scan_with_range_filter_compares_timestamps():
+    backend = InMemoryBackend()
+    backend.bulk("events", [
+        {"id": "past", "start_time": "2025-05-31T23:00:00Z"},
+        {"id": "offset", "start_time": "2025-06-01T02:30:00+02:00"}, # 00:30 UTC
+        {"id": "later", "start_time": "2025-06-02T00:00:00"},
+        {"id": "undated"},
+    ])
+
+    upcoming = backend.scan("events", source_fields=["id"],
+                            range_filter={"start_time": {"gte": "2025-06-01T00:00:00+00:00"}})
+    assert sorted(doc["id"] for doc in upcoming) == ["later", "offset"]
+
+
+def test_elasticsearch_hybrid_search_fuses_msearch_legs_client_side():
+    def hits(*ids):
+        return {"hits": {"hits": [{"_id": doc_id, "_score": 1.0, "_source": {"id": doc_id}} for doc_id in ids]}}
+    client = MagicMock()
+    client.msearch.return_value = {"responses": [hits("lexical", "both"), hits("both", "vector", "extra")]}
+    backend = ElasticsearchBackend(client)
+
+    results = backend.hybrid_search("events", "poetry", ["title"], "vector_embedding", [0.1, 0.2],
+                                    k=3, lexical_candidates=2, knn_candidates=3, rank_constant=60,
+                                    source_excludes=["vector_embedding", "vector_chunks"])
+
+    searches = client.msearch.call_args.kwargs["searches"]
+    assert searches[1]["size"] == 2
+    assert searches[3]["knn"]["k"] == 3 and searches[3]["size"] == 3 # Not capped by the lexical limit
+    assert all("retriever" not in search for search in searches) # rrf retriever needs a paid license
+    # Candidates of both legs come back without their vectors
+    assert searches[1]["_source"] == searches[3]["_source"] == {"excludes": ["vector_embedding", "vector_chunks"]}
+    assert [hit["_id"] for hit in results] == ["both", "lexical", "vector"]
+    assert results[0]["_score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert results[0]["_source"] == {"id": "both"}
+
+
+def test_searches_on_empty_or_vectorless_index_return_nothing():
+    backend = InMemoryBackend()
+    assert backend.knn_search("missing", "vector_embedding", [1.0, 0.0]) == []
+    backend.create_index("events", {})
+    backend.index("events", "no_vector", {"id": "no_vector", "title": "poetry night", "vector_embedding": None})
+
+    assert backend.knn_search("events", "vector_chunks.vector", [1.0, 0.0]) == []
+    hits = backend.hybrid_search("events", "poetry", ["title"], "vector_embedding", [1.0, 0.0])
+    assert [hit["_id"] for hit in hits] == ["no_vector"]
+
+
+def test_put_mapping_adds_fields_and_rejects_conflicts():
+    client = MagicMock()
+    ElasticsearchBackend(client).put_mapping("events", {"vector_chunks": {"type": "nested"}})
+    client.indices.put_mapping.assert_called_once_with(index="events", properties={"vector_chunks": {"type": "nested"}})
+
+    backend = InMemoryBackend()
+    backend.create_index("events", {"mappings": {"properties": {"id": {"type": "keyword"}}}})
+    backend.put_mapping("events", {"vector_chunks": {"type": "nested"}})
+    backend.put_mapping("events", {"vector_chunks": {"type": "nested"}}) # Same definition again is fine
+    with pytest.raises(ValueError):
+        backend.put_mapping("events", {"id": {"type": "text"}})
+
+
+def test_mget_excludes_fields():
+    backend = InMemoryBackend()
+    backend.index("events", "a", {"id": "a", "title": "Poetry", "vector_embedding": [1.0, 0.0]})
+    assert backend.mget("events", ["a", "missing"], source_excludes=["vector_embedding"]) == [{"id": "a", "title": "Poetry"}, None]
+
+    client = MagicMock()
+    client.mget.return_value = {"docs": [{"found": True, "_source": {"id": "a"}}]}
+    assert ElasticsearchBackend(client).mget("events", ["a"], source_excludes=["vector_embedding"]) == [{"id": "a"}]
+    assert client.mget.call_args.kwargs["source_excludes"] == ["vector_embedding"]
+
+
+def test_knn_search_excludes_source_fields():
+    backend = InMemoryBackend()
+    backend.index("events", "a", {"id": "a", "vector_embedding": [1.0, 0.0]})
+    hits = backend.knn_search("events", "vector_embedding", [1.0, 0.0], source_excludes=["vector_embedding"])
+    assert hits[0]["_source"] == {"id": "a"}
+
+    client = MagicMock()
+    client.search.return_value = {"hits": {"hits": []}}
+    ElasticsearchBackend(client).knn_search("events", "vector_embedding", [1.0, 0.0], source_excludes=["vector_embedding"])
+    assert client.search.call_args.kwargs["source_excludes"] == ["vector_embedding"]